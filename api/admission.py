@@ -0,0 +1,90 @@
+import asyncio
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+
+import metrics
+
+
+class AdmissionRejected(Exception):
+    """
+    Запрос не допущен к модели: очередь переполнена или время ожидания истекло.
+    """
+
+    def __init__(self, reason: str):
+        super().__init__(reason)
+        self.reason = reason
+
+
+class AdmissionController:
+    """
+    Ограничивает число одновременных запросов к модели.
+
+    Запросы сверх max_in_flight ждут в очереди (FIFO) не дольше
+    max_queue_time секунд; если в очереди уже max_queue запросов,
+    новый запрос отклоняется сразу.
+    """
+
+    def __init__(self, max_in_flight: int, max_queue: int, max_queue_time: float):
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.max_queue_time = max_queue_time
+        self.in_flight = 0
+        self._waiters = deque()
+
+    async def acquire(self):
+        if self.in_flight < self.max_in_flight and not self._waiters:
+            self.in_flight += 1
+            metrics.ADMISSION_WAIT.observe(0)
+            return
+        if len(self._waiters) >= self.max_queue:
+            metrics.ADMISSION_REJECTED.labels("queue_full").inc()
+            raise AdmissionRejected("queue_full")
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        metrics.ADMISSION_QUEUE_DEPTH.set(len(self._waiters))
+        start = time.perf_counter()
+        try:
+            await asyncio.wait({waiter}, timeout=self.max_queue_time)
+        except asyncio.CancelledError:
+            # Клиент ушёл: если слот уже был передан, отдаём его следующему
+            if waiter.done() and not waiter.cancelled():
+                self.release()
+            else:
+                waiter.cancel()
+                self._discard(waiter)
+            raise
+        finally:
+            metrics.ADMISSION_WAIT.observe(time.perf_counter() - start)
+
+        if not waiter.done():
+            waiter.cancel()
+            self._discard(waiter)
+            metrics.ADMISSION_REJECTED.labels("queue_timeout").inc()
+            raise AdmissionRejected("queue_timeout")
+
+    def release(self):
+        # Слот передаётся первому ожидающему без уменьшения счётчика
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            metrics.ADMISSION_QUEUE_DEPTH.set(len(self._waiters))
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.in_flight -= 1
+
+    @asynccontextmanager
+    async def slot(self):
+        await self.acquire()
+        try:
+            yield
+        finally:
+            self.release()
+
+    def _discard(self, waiter: asyncio.Future):
+        try:
+            self._waiters.remove(waiter)
+        except ValueError:
+            pass
+        metrics.ADMISSION_QUEUE_DEPTH.set(len(self._waiters))
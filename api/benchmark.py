@@ -0,0 +1,107 @@
+import argparse
+import asyncio
+import os
+import time
+
+import httpx
+
+from stub_ollama import ServerThread, StubSettings, create_stub_app
+
+SCHEMA = (
+    "Справочник.Товары : Ссылка (Справочник.Товары) , Наименование (Строка) | "
+    "Справочник.Магазины : Ссылка (Справочник.Магазины) , Наименование (Строка)"
+)
+QUESTION = "Покажите названия всех товаров."
+
+
+async def run_level(url: str, concurrency: int, total: int) -> float:
+    """
+    Отправляет total запросов к /translate, держа не более concurrency
+    одновременно, и возвращает пропускную способность (запросов в секунду).
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    limits = httpx.Limits(max_connections=concurrency)
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=120) as client:
+
+        async def one(i):
+            async with semaphore:
+                response = await client.post(
+                    "/translate", json={"schema": SCHEMA, "question": f"{QUESTION} {i}"}
+                )
+                response.raise_for_status()
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(total)))
+        return total / (time.perf_counter() - start)
+
+
+def run():
+    parser = argparse.ArgumentParser(
+        description="Бенчмарк /translate на заглушке сервера Ollama"
+    )
+    parser.add_argument(
+        "--delay",
+        type=float,
+        nargs="+",
+        default=[0.2],
+        help="задержка каждой заглушки; несколько значений - несколько серверов",
+    )
+    parser.add_argument(
+        "--backend", choices=["ollama", "openai"], default="ollama", help="LLM_BACKEND"
+    )
+    parser.add_argument("--requests", type=int, default=64)
+    parser.add_argument("--levels", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32])
+    parser.add_argument("--stub-port", type=int, default=18434)
+    parser.add_argument("--api-port", type=int, default=18000)
+    parser.add_argument(
+        "--max-in-flight",
+        type=int,
+        help="ADMISSION_MAX_IN_FLIGHT (по умолчанию - наибольший уровень --levels)",
+    )
+    parser.add_argument(
+        "--max-queue",
+        type=int,
+        help="ADMISSION_MAX_QUEUE (по умолчанию - наибольший уровень --levels)",
+    )
+    args = parser.parse_args()
+
+    # Переменные окружения должны быть заданы до импорта API
+    ports = [args.stub_port + i for i, _ in enumerate(args.delay)]
+    os.environ["OLLAMA_SERVER_URL"] = ",".join(f"http://127.0.0.1:{p}" for p in ports)
+    os.environ.setdefault("OLLAMA_MODEL_NAME", "stub")
+    os.environ["LLM_BACKEND"] = args.backend
+    # Иначе пропускная способность ограничена контролем допуска, а не сервером
+    max_in_flight = args.max_in_flight or max(args.levels)
+    os.environ["ADMISSION_MAX_IN_FLIGHT"] = str(max_in_flight)
+    os.environ["ADMISSION_MAX_QUEUE"] = str(args.max_queue or max(args.levels))
+    import main
+
+    stubs = [
+        ServerThread(create_stub_app(StubSettings(delay=delay)), port)
+        for delay, port in zip(args.delay, ports)
+    ]
+    api = ServerThread(main.app, args.api_port)
+    for stub in stubs:
+        stub.start()
+    api.start()
+    try:
+        url = f"http://127.0.0.1:{args.api_port}"
+        print(
+            f"Задержки заглушек: {args.delay} с, запросов: {args.requests}, "
+            f"одновременно в работе не больше {max_in_flight}"
+        )
+        for level in args.levels:
+            rps = asyncio.run(run_level(url, level, args.requests))
+            print(f"concurrency={level:>3}  throughput={rps:8.2f} req/s")
+        # Распределение запросов по серверам
+        for line in httpx.get(f"{url}/metrics").text.splitlines():
+            if line.startswith("backend_requests_total"):
+                print(line)
+    finally:
+        api.stop()
+        for stub in stubs:
+            stub.stop()
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,78 @@
+import time
+
+import metrics
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+
+class CircuitOpen(Exception):
+    """
+    Запрос отклонён без обращения к Ollama: автомат разомкнут.
+    """
+
+    def __init__(self, retry_after: float):
+        super().__init__(f"retry after {retry_after:.1f}s")
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """
+    Автоматический выключатель для запросов к Ollama.
+
+    После failure_threshold подряд неудачных запросов автомат размыкается,
+    и запросы отклоняются сразу. Через reset_timeout секунд пропускается
+    один пробный запрос (полуразомкнутое состояние): при успехе автомат
+    замыкается, при неудаче снова размыкается.
+    """
+
+    def __init__(self, failure_threshold: int, reset_timeout: float):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probe_in_flight = False
+        metrics.BREAKER_STATE.set(STATE_VALUES[CLOSED])
+
+    def before_request(self):
+        if self.state == CLOSED:
+            return
+        elapsed = time.monotonic() - self.opened_at
+        if self.state == OPEN and elapsed >= self.reset_timeout:
+            self._set_state(HALF_OPEN)
+        if self.state == HALF_OPEN and not self._probe_in_flight:
+            self._probe_in_flight = True
+            return
+        metrics.BREAKER_REJECTED.inc()
+        raise CircuitOpen(max(self.reset_timeout - elapsed, 1.0))
+
+    def record_success(self):
+        self.failures = 0
+        self._probe_in_flight = False
+        if self.state != CLOSED:
+            self._set_state(CLOSED)
+
+    def record_failure(self):
+        self.failures += 1
+        self._probe_in_flight = False
+        if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+            if self.state != OPEN:
+                metrics.BREAKER_OPENED.inc()
+            self.opened_at = time.monotonic()
+            self._set_state(OPEN)
+
+    def record_cancelled(self):
+        # Пробный запрос прерван без результата - следующий запрос станет пробным
+        self._probe_in_flight = False
+
+    @property
+    def is_open(self) -> bool:
+        return self.state == OPEN
+
+    def _set_state(self, state: str):
+        self.state = state
+        metrics.BREAKER_STATE.set(STATE_VALUES[state])
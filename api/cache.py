@@ -0,0 +1,130 @@
+import asyncio
+import hashlib
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+
+def schema_hash(schema: str) -> str:
+    """
+    Возвращает хэш текста схемы БД (sha256, hex).
+    """
+    return hashlib.sha256(schema.encode("utf-8")).hexdigest()
+
+
+def normalize_question(question: str) -> str:
+    """
+    Приводит вопрос к каноническому виду для ключа кэша:
+    нижний регистр, без лишних пробелов.
+    """
+    return re.sub(r"\s+", " ", question).strip().lower()
+
+
+def translation_key(model: str, schema_id: str, question: str) -> str:
+    """
+    Формирует ключ из имени модели, хэша схемы и нормализованного вопроса.
+    """
+    raw = "\x00".join([model, schema_id, normalize_question(question)])
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class TranslationCache:
+    """
+    Кэш результатов перевода с вытеснением LRU и сроком жизни записей.
+
+    Первый уровень хранится в памяти и ограничен числом записей,
+    второй (необязательный) - в файле SQLite и переживает перезапуск сервиса.
+    """
+
+    def __init__(self, max_entries: int, ttl: float, disk_path: Optional[str] = None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.disk_hits = 0
+        self._memory = OrderedDict()
+        self._disk = None
+        self._disk_lock = threading.Lock()
+        if disk_path:
+            self._disk = sqlite3.connect(disk_path, check_same_thread=False)
+            self._disk.execute(
+                "CREATE TABLE IF NOT EXISTS translations "
+                "(key TEXT PRIMARY KEY, content TEXT NOT NULL, expires REAL NOT NULL)"
+            )
+            self._disk.commit()
+
+    async def get(self, key: str) -> Optional[str]:
+        """
+        Возвращает сохранённый результат или None, если записи нет или она устарела.
+        """
+        entry = self._memory.get(key)
+        if entry is not None:
+            content, expires = entry
+            if expires > time.time():
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return content
+            del self._memory[key]
+
+        if self._disk is not None:
+            row = await asyncio.to_thread(self._disk_get, key)
+            if row is not None and row[1] > time.time():
+                self._remember(key, row[0], row[1])
+                self.hits += 1
+                self.disk_hits += 1
+                return row[0]
+
+        self.misses += 1
+        return None
+
+    async def set(self, key: str, content: str):
+        """
+        Сохраняет результат в памяти и, если он включён, на диске.
+        """
+        expires = time.time() + self.ttl
+        self._remember(key, content, expires)
+        if self._disk is not None:
+            await asyncio.to_thread(self._disk_set, key, content, expires)
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._memory),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+        }
+
+    def close(self):
+        if self._disk is not None:
+            with self._disk_lock:
+                self._disk.close()
+            self._disk = None
+
+    def _remember(self, key: str, content: str, expires: float):
+        self._memory[key] = (content, expires)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def _disk_get(self, key: str):
+        with self._disk_lock:
+            return self._disk.execute(
+                "SELECT content, expires FROM translations WHERE key = ?", (key,)
+            ).fetchone()
+
+    def _disk_set(self, key: str, content: str, expires: float):
+        with self._disk_lock:
+            self._disk.execute(
+                "INSERT OR REPLACE INTO translations (key, content, expires) "
+                "VALUES (?, ?, ?)",
+                (key, content, expires),
+            )
+            # Заодно удаляем устаревшие записи, чтобы файл не рос бесконечно
+            self._disk.execute(
+                "DELETE FROM translations WHERE expires <= ?", (time.time(),)
+            )
+            self._disk.commit()
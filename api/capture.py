@@ -0,0 +1,232 @@
+import argparse
+import asyncio
+import glob
+import gzip
+import json
+import logging
+import os
+import time
+
+import metrics
+from cache import normalize_question
+from schemas import build_system_prompt
+
+logger = logging.getLogger(__name__)
+
+
+class TrafficCapture:
+    """
+    Запись переводов (хэш схемы, вопрос, запрос, время) для регрессионных
+    наборов без задержки обработки запросов.
+
+    Записи попадают в очередь в памяти; фоновая задача дописывает их
+    пачками в сжатые сегменты traffic-*.jsonl.gz, начиная новый сегмент
+    каждые segment_records записей. Если очередь заполнена, запись
+    отбрасывается, а не ждёт. Текст схемы сохраняется один раз
+    в schemas-*.jsonl.gz, записи ссылаются на него по schema_id.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        max_queue: int,
+        segment_records: int,
+        batch_size: int = 256,
+    ):
+        self.directory = directory
+        self.segment_records = segment_records
+        self.batch_size = batch_size
+        self._queue = asyncio.Queue(max_queue)
+        self._stopped = False
+        self._segment = None
+        self._segment_size = 0
+        self._segment_number = 0
+        self._started = time.strftime("%Y%m%d-%H%M%S")
+        os.makedirs(directory, exist_ok=True)
+        self._schema_ids = set(load_schemas(directory))
+        # Свой файл схем на каждый запуск: файл, оборванный при аварийной
+        # остановке, не дописывается
+        self._schemas = None
+        self._writer = asyncio.create_task(self._run())
+
+    def record(
+        self,
+        schema_id: str,
+        schema: str,
+        question: str,
+        query: str,
+        source: str,
+        latency: float,
+        timings: dict = None,
+    ):
+        """
+        Ставит перевод в очередь на запись, не ожидая места в ней.
+        """
+        if self._stopped:
+            return
+        record = {
+            "ts": time.time(),
+            "schema_id": schema_id,
+            "question": question,
+            "query": query,
+            "source": source,
+            "latency_ms": round(latency * 1000, 2),
+            **(timings or {}),
+        }
+        try:
+            self._queue.put_nowait((schema, record))
+        except asyncio.QueueFull:
+            metrics.CAPTURE_RECORDS.labels("dropped").inc()
+
+    async def aclose(self):
+        """
+        Дописывает записи из очереди и закрывает файлы.
+        """
+        self._stopped = True
+        await self._queue.put(None)
+        await self._writer
+        await asyncio.to_thread(self._close_files)
+
+    async def _run(self):
+        while True:
+            batch = [await self._queue.get()]
+            while len(batch) < self.batch_size and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+            stop = None in batch
+            batch = [item for item in batch if item is not None]
+            try:
+                await asyncio.to_thread(self._write, batch)
+            except OSError as e:
+                metrics.CAPTURE_RECORDS.labels("failed").inc(len(batch))
+                logger.warning("Failed to write traffic capture: %s", e)
+            else:
+                metrics.CAPTURE_RECORDS.labels("written").inc(len(batch))
+            if stop:
+                return
+
+    def _write(self, batch: list):
+        for schema, record in batch:
+            if record["schema_id"] not in self._schema_ids:
+                self._schema_ids.add(record["schema_id"])
+                if self._schemas is None:
+                    name = f"schemas-{self._started}.jsonl.gz"
+                    self._schemas = gzip.open(
+                        os.path.join(self.directory, name), "wt", encoding="utf-8"
+                    )
+                line = {"schema_id": record["schema_id"], "schema": schema}
+                self._schemas.write(json.dumps(line, ensure_ascii=False) + "\n")
+            if self._segment is None or self._segment_size >= self.segment_records:
+                self._rotate()
+            self._segment.write(json.dumps(record, ensure_ascii=False) + "\n")
+            self._segment_size += 1
+        # Сброс сжатого потока: после аварийной остановки читаются
+        # все записи, кроме последней пачки
+        if self._schemas is not None:
+            self._schemas.flush()
+        if self._segment is not None:
+            self._segment.flush()
+
+    def _rotate(self):
+        if self._segment is not None:
+            self._segment.close()
+        self._segment_number += 1
+        name = f"traffic-{self._started}-{self._segment_number:04d}.jsonl.gz"
+        self._segment = gzip.open(
+            os.path.join(self.directory, name), "wt", encoding="utf-8"
+        )
+        self._segment_size = 0
+
+    def _close_files(self):
+        if self._segment is not None:
+            self._segment.close()
+        if self._schemas is not None:
+            self._schemas.close()
+
+
+def read_jsonl(path: str):
+    """
+    Читает сжатый JSONL, пропуская хвост, оборванный при остановке сервиса.
+    """
+    if not os.path.exists(path):
+        return
+    try:
+        with gzip.open(path, "rt", encoding="utf-8") as file:
+            for line in file:
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    return
+    except (EOFError, gzip.BadGzipFile, OSError):
+        return
+
+
+def load_schemas(directory: str) -> dict:
+    schemas = {}
+    for path in sorted(glob.glob(os.path.join(directory, "schemas-*.jsonl.gz"))):
+        for s in read_jsonl(path):
+            schemas[s["schema_id"]] = s["schema"]
+    return schemas
+
+
+def load_capture(directory: str) -> list:
+    """
+    Загружает записанные переводы в порядке записи, добавляя к каждому
+    текст схемы ("schema").
+    """
+    schemas = load_schemas(directory)
+    records = []
+    for path in sorted(glob.glob(os.path.join(directory, "traffic-*.jsonl.gz"))):
+        for record in read_jsonl(path):
+            schema = schemas.get(record["schema_id"])
+            if schema is not None:
+                records.append({"schema": schema, **record})
+    return records
+
+
+def export_dataset(directory: str, output: str, sources: set = None) -> int:
+    """
+    Сохраняет записанные переводы в формате выборок датасета
+    (dataset/create_final_dataset.py), который читают load_dataset_pairs
+    и evaluate_examples.py. Повторы вопроса по той же схеме сводятся
+    к последнему переводу.
+    """
+    latest = {}
+    for record in load_capture(directory):
+        if sources and record["source"] not in sources:
+            continue
+        key = (record["schema_id"], normalize_question(record["question"]))
+        latest[key] = record
+    with open(output, "w", encoding="utf-8") as file:
+        for record in latest.values():
+            system = build_system_prompt(record["schema"])
+            json_obj = {
+                "messages": [
+                    {"content": system, "role": "system"},
+                    {"content": record["question"], "role": "user"},
+                    {"content": record["query"], "role": "assistant"},
+                ]
+            }
+            file.write(json.dumps(json_obj, ensure_ascii=False) + "\n")
+    return len(latest)
+
+
+def run():
+    parser = argparse.ArgumentParser(
+        description="Выгрузка записанных переводов в формате выборки датасета"
+    )
+    parser.add_argument("directory", help="CAPTURE_DIR")
+    parser.add_argument("output", help="файл JSONL, например regression.json")
+    parser.add_argument(
+        "--source",
+        nargs="+",
+        help="только переводы из указанных источников (model, cache, similar_cache)",
+    )
+    args = parser.parse_args()
+    count = export_dataset(
+        args.directory, args.output, set(args.source) if args.source else None
+    )
+    print(f"Сохранено {count} пар вопрос - запрос в {args.output}")
+
+
+if __name__ == "__main__":
+    run()
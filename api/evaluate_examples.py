@@ -0,0 +1,137 @@
+import argparse
+import asyncio
+import csv
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+import httpx
+
+from schemas import load_dataset_pairs
+from stub_ollama import ServerThread, StubSettings, create_stub_app
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "evaluate"))
+from batch_scorer import COLUMNS, score_chunk  # noqa: E402
+
+
+async def translate_all(url: str, pairs: list, concurrency: int) -> list:
+    """
+    Переводит вопросы выборки через /translate и возвращает
+    список (запрос модели, время ответа в секундах, код ответа);
+    при ошибке запрос модели - пустая строка.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    limits = httpx.Limits(max_connections=concurrency)
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=300) as client:
+
+        async def one(schema, question):
+            async with semaphore:
+                start = time.perf_counter()
+                response = await client.post(
+                    "/translate", json={"schema": schema, "question": question}
+                )
+                latency = time.perf_counter() - start
+                if response.status_code != 200:
+                    return "", latency, response.status_code
+                return response.json()["content"].strip(), latency, 200
+
+        return await asyncio.gather(*(one(s, q) for s, q, _ in pairs))
+
+
+def run():
+    parser = argparse.ArgumentParser(
+        description=(
+            "Офлайн-оценка перевода через API с few-shot примерами: "
+            "Component matching (evaluate/evaluate_model.py), Exact match и задержка"
+        )
+    )
+    parser.add_argument("--server", help="OLLAMA_SERVER_URL сервера модели")
+    parser.add_argument("--model", help="OLLAMA_MODEL_NAME")
+    parser.add_argument(
+        "--backend", choices=["ollama", "openai"], default="ollama", help="LLM_BACKEND"
+    )
+    parser.add_argument("--test", default="../dataset/data/ru_test.json")
+    parser.add_argument(
+        "--examples",
+        default="../dataset/data/ru_train.json",
+        help="выборка с примерами; пустая строка - без примеров",
+    )
+    parser.add_argument("--k", type=int, default=3, help="число примеров в промпте")
+    parser.add_argument("--limit", type=int, help="ограничить число вопросов")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--output", help="CSV с колонками ref;pred;latency")
+    parser.add_argument(
+        "--stub", action="store_true", help="заглушка вместо сервера модели"
+    )
+    parser.add_argument("--stub-port", type=int, default=18434)
+    parser.add_argument("--api-port", type=int, default=18000)
+    args = parser.parse_args()
+
+    # Переменные окружения должны быть заданы до импорта API
+    stub = None
+    if args.stub:
+        stub = ServerThread(create_stub_app(StubSettings(delay=0.01)), args.stub_port)
+        args.server = f"http://127.0.0.1:{args.stub_port}"
+        args.model = "stub"
+    if not args.server or not args.model:
+        parser.error("--server and --model are required without --stub")
+    os.environ["OLLAMA_SERVER_URL"] = args.server
+    os.environ["OLLAMA_MODEL_NAME"] = args.model
+    os.environ["LLM_BACKEND"] = args.backend
+    os.environ["FEW_SHOT_EXAMPLES"] = args.examples
+    os.environ["FEW_SHOT_K"] = str(args.k)
+    os.environ["OLLAMA_DETERMINISTIC"] = "true"
+    # Каждый вопрос должен дойти до модели: кэши отключены
+    os.environ["TRANSLATION_CACHE_SIZE"] = "0"
+    os.environ["SIMILAR_CACHE"] = "false"
+    os.environ["ADMISSION_MAX_IN_FLIGHT"] = str(args.concurrency)
+    os.environ["JOBS_DIR"] = tempfile.mkdtemp()
+    import main
+
+    pairs = load_dataset_pairs(args.test)[: args.limit]
+    api = ServerThread(main.app, args.api_port)
+    if stub is not None:
+        stub.start()
+    api.start()
+    try:
+        start = time.perf_counter()
+        results = asyncio.run(
+            translate_all(f"http://127.0.0.1:{args.api_port}", pairs, args.concurrency)
+        )
+        elapsed = time.perf_counter() - start
+    finally:
+        api.stop()
+        if stub is not None:
+            stub.stop()
+
+    predicted = [pred for pred, _, _ in results]
+    latencies = sorted(latency for _, latency, _ in results)
+    failed = sum(status != 200 for _, _, status in results)
+    references = [query for _, _, query in pairs]
+    # Те же определения метрик, что в evaluate/batch_scorer.py
+    averages = dict(zip(COLUMNS, score_chunk(list(zip(predicted, references))).mean(0)))
+
+    print(f"Модель: {args.model}, примеров в промпте: {args.k if args.examples else 0}")
+    print(f"Вопросов: {len(pairs)}, время: {elapsed:.1f} с")
+    print(f"Ошибок запросов (ответ не 200): {failed}")
+    print(f"Exact matching: {averages['exact']:.4f}")
+    for component in COLUMNS[1:]:
+        print(f"F1 {component.upper()}: {averages[component]:.4f}")
+    p95 = latencies[min(int(0.95 * len(latencies)), len(latencies) - 1)]
+    print(
+        f"Задержка: среднее {statistics.mean(latencies):.3f} с, "
+        f"p50 {statistics.median(latencies):.3f} с, p95 {p95:.3f} с"
+    )
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8", newline="") as file:
+            writer = csv.writer(file, delimiter=";")
+            writer.writerow(["", "ref", "pred", "latency"])
+            for i, (ref, (pred, latency, _)) in enumerate(zip(references, results)):
+                writer.writerow([i, ref, pred, f"{latency:.4f}"])
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,52 @@
+import logging
+
+from cache import schema_hash
+from schemas import load_dataset_pairs
+from similar_cache import SimilarQuestionIndex
+
+logger = logging.getLogger(__name__)
+
+
+class ExampleStore:
+    """
+    Примеры вопрос - запрос из обучающей выборки для few-shot промпта.
+
+    Для каждой схемы БД строится индекс n-грамм вопросов (как в кэше
+    близких вопросов); к вопросу подбираются k самых близких примеров той
+    же схемы. Для схем без примеров промпт не меняется. Индексы
+    не ограничены по размеру: примеры из нескольких файлов и добавленные
+    позже не вытесняют друг друга.
+    """
+
+    def __init__(self):
+        self._indexes = {}
+
+    def seed(self, path: str):
+        """
+        Добавляет примеры из выборки датасета (dataset/data/ru_train.json).
+        """
+        try:
+            pairs = load_dataset_pairs(path)
+        except FileNotFoundError:
+            logger.warning("Few-shot examples file %s not found", path)
+            return
+        for schema, question, query in pairs:
+            schema_id = schema_hash(schema)
+            index = self._indexes.get(schema_id)
+            if index is None:
+                index = self._indexes[schema_id] = SimilarQuestionIndex(None)
+            index.add(question, query)
+        logger.info("Loaded %d few-shot examples from %s", len(pairs), path)
+
+    def select(self, schema_id: str, question: str, k: int) -> list:
+        """
+        Возвращает до k пар (вопрос, запрос); самый близкий пример - последним,
+        непосредственно перед вопросом пользователя.
+        """
+        index = self._indexes.get(schema_id)
+        if index is None or k <= 0:
+            return []
+        return index.nearest(question, k)[::-1]
+
+    def __len__(self):
+        return sum(len(i) for i in self._indexes.values())
@@ -0,0 +1,42 @@
+from collections import deque
+
+import metrics
+
+
+class Hedger:
+    """
+    Решает, когда отправлять дублирующий (hedge) запрос на другой сервер.
+
+    Задержка перед дублирующим запросом - заданный перцентиль времени
+    последних успешных запросов (но не меньше min_delay). Доля дублирующих
+    запросов ограничена max_rate от общего числа запросов.
+    """
+
+    def __init__(
+        self, percentile: float, min_delay: float, max_rate: float, window: int = 500
+    ):
+        self.percentile = percentile
+        self.min_delay = min_delay
+        self.max_rate = max_rate
+        self.requests = 0
+        self.hedges = 0
+        self._latencies = deque(maxlen=window)
+
+    def record(self, latency: float):
+        self._latencies.append(latency)
+
+    def delay(self) -> float:
+        self.requests += 1
+        if not self._latencies:
+            return self.min_delay
+        ordered = sorted(self._latencies)
+        index = min(int(self.percentile * len(ordered)), len(ordered) - 1)
+        return max(ordered[index], self.min_delay)
+
+    def allow(self) -> bool:
+        if self.hedges + 1 > self.max_rate * self.requests:
+            metrics.HEDGE_SKIPPED.inc()
+            return False
+        self.hedges += 1
+        metrics.HEDGE_REQUESTS.inc()
+        return True
@@ -0,0 +1,308 @@
+import asyncio
+import json
+import logging
+import os
+import random
+import uuid
+from typing import Optional
+
+from fastapi import HTTPException
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+QUEUED = "queued"
+RUNNING = "running"
+COMPLETED = "completed"
+
+# Временные ошибки перевода: перегрузка (429), ошибка сервера модели (502),
+# разомкнутый автомат отключения (503). Такие записи не сохраняются
+# в результаты, а переводятся повторно
+TRANSIENT_STATUS_CODES = {429, 502, 503}
+
+
+class Job:
+    def __init__(self, job_id: str, directory: str):
+        self.job_id = job_id
+        self.directory = directory
+        self.status = QUEUED
+        self.total = 0
+        self.completed = 0
+        self.failed = 0
+        self.schemas = {}
+
+    @property
+    def input_path(self) -> str:
+        return os.path.join(self.directory, "input.jsonl")
+
+    @property
+    def results_path(self) -> str:
+        return os.path.join(self.directory, "results.jsonl")
+
+    @property
+    def state_path(self) -> str:
+        return os.path.join(self.directory, "state.json")
+
+    @property
+    def schemas_path(self) -> str:
+        return os.path.join(self.directory, "schemas.json")
+
+    def to_dict(self) -> dict:
+        return {
+            "job_id": self.job_id,
+            "status": self.status,
+            "total": self.total,
+            "completed": self.completed,
+            "failed": self.failed,
+        }
+
+    def save_state(self):
+        tmp_path = self.state_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as file:
+            json.dump(self.to_dict(), file)
+        os.replace(tmp_path, self.state_path)
+
+
+class JobManager:
+    """
+    Фоновая обработка заданий на массовый перевод.
+
+    Задание - JSONL-файл с записями {"schema" | "schema_id", "question"}.
+    Результаты дописываются в results.jsonl по мере готовности и служат
+    контрольной точкой: после перезапуска сервиса незавершённые задания
+    продолжаются с необработанных записей. Одновременно обрабатывается
+    не более concurrency записей всех заданий.
+
+    Временные ошибки (недоступность модели, перегрузка) не записываются
+    в результаты: запись переводится повторно с экспоненциальной задержкой,
+    не меньшей Retry-After ответа, пока не будет получен перевод или
+    постоянная ошибка (неверная запись, неизвестная схема, слишком
+    длинный промпт).
+
+    Схемы, на которые записи ссылаются по schema_id, сохраняются вместе
+    с заданием: реестр схем хранится в памяти и после перезапуска или
+    вытеснения схемы задание иначе не смогло бы продолжиться.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        concurrency: int,
+        schemas,
+        process,
+        retry_base: float = 1,
+        retry_max: float = 60,
+    ):
+        self.directory = directory
+        self.schemas = schemas
+        self.process = process
+        self.retry_base = retry_base
+        self.retry_max = retry_max
+        self.jobs = {}
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._tasks = set()
+        os.makedirs(directory, exist_ok=True)
+
+    async def create(self, chunks) -> Job:
+        """
+        Сохраняет загружаемый JSONL (асинхронный итератор байтов) и ставит
+        задание в очередь.
+        """
+        job_id = uuid.uuid4().hex
+        job = Job(job_id, os.path.join(self.directory, job_id))
+        os.makedirs(job.directory)
+        with open(job.input_path, "wb") as file:
+            async for chunk in chunks:
+                if chunk:
+                    file.write(chunk)
+        job.total = await asyncio.to_thread(count_records, job.input_path)
+        schema_ids = await asyncio.to_thread(referenced_schema_ids, job.input_path)
+        for schema_id in schema_ids:
+            entry = self.schemas.get(schema_id)
+            if entry is not None:
+                job.schemas[schema_id] = entry.schema
+        with open(job.schemas_path, "w", encoding="utf-8") as file:
+            json.dump(job.schemas, file, ensure_ascii=False)
+        job.save_state()
+        self.jobs[job_id] = job
+        self._start(job)
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        return self.jobs.get(job_id)
+
+    def resume(self):
+        """
+        Загружает сохранённые задания и запускает незавершённые.
+        """
+        for job_id in sorted(os.listdir(self.directory)):
+            job = Job(job_id, os.path.join(self.directory, job_id))
+            if not os.path.exists(job.state_path):
+                continue
+            with open(job.state_path, encoding="utf-8") as file:
+                state = json.load(file)
+            job.status = state["status"]
+            job.total = state["total"]
+            with open(job.schemas_path, encoding="utf-8") as file:
+                job.schemas = json.load(file)
+            self.jobs[job_id] = job
+            self._count_results(job)
+            if job.status != COMPLETED:
+                logger.info(
+                    "Resuming job %s (%d/%d)", job_id, job.completed, job.total
+                )
+                self._start(job)
+
+    async def aclose(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    def _start(self, job: Job):
+        task = asyncio.create_task(self._run(job))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    def _count_results(self, job: Job) -> set:
+        done = set()
+        job.completed = job.failed = 0
+        if not os.path.exists(job.results_path):
+            return done
+        with open(job.results_path, encoding="utf-8") as file:
+            for line in file:
+                try:
+                    result = json.loads(line)
+                except json.JSONDecodeError:
+                    # Строка, оборванная при остановке сервиса
+                    continue
+                done.add(result["index"])
+                job.completed += 1
+                job.failed += result.get("error") is not None
+        return done
+
+    async def _run(self, job: Job):
+        await asyncio.to_thread(truncate_partial_line, job.results_path)
+        done = self._count_results(job)
+        job.status = RUNNING
+        job.save_state()
+        pending = set()
+        with open(job.results_path, "a", encoding="utf-8") as results, open(
+            job.input_path, encoding="utf-8"
+        ) as records:
+            try:
+                for index, line in enumerate(records):
+                    # Пустые строки (например, в конце файла) - не записи
+                    if index in done or not line.strip():
+                        continue
+                    await self._semaphore.acquire()
+                    task = asyncio.create_task(
+                        self._process(job, index, line, results)
+                    )
+                    pending.add(task)
+                    task.add_done_callback(pending.discard)
+                await asyncio.gather(*pending)
+            finally:
+                for task in pending:
+                    task.cancel()
+        job.status = COMPLETED
+        job.save_state()
+
+    async def _process(self, job: Job, index: int, line: str, results):
+        result = {"index": index}
+        try:
+            record = json.loads(line)
+            result["question"] = record.get("question")
+            schema_id = record.get("schema_id")
+            if schema_id in job.schemas and "schema" not in record:
+                record = {"schema": job.schemas[schema_id], **record}
+                del record["schema_id"]
+            result["content"] = await self._translate(record)
+        except HTTPException as e:
+            result["error"] = str(e.detail)
+        except Exception as e:
+            result["error"] = f"{e}"
+        finally:
+            self._semaphore.release()
+        job.completed += 1
+        job.failed += "error" in result
+        metrics.JOB_RECORDS.labels("error" if "error" in result else "ok").inc()
+        results.write(json.dumps(result, ensure_ascii=False) + "\n")
+        results.flush()
+
+    async def _translate(self, record: dict) -> str:
+        attempt = 0
+        while True:
+            try:
+                return await self.process(record)
+            except HTTPException as e:
+                # У UpstreamError с ответом 4xx от модели transient=False
+                if e.status_code not in TRANSIENT_STATUS_CODES or not getattr(
+                    e, "transient", True
+                ):
+                    raise
+                attempt += 1
+                delay = self._retry_delay(e, attempt)
+                metrics.JOB_RECORDS.labels("retry").inc()
+                logger.info("Job record failed (%s), retry in %.1fs", e.detail, delay)
+                await asyncio.sleep(delay)
+
+    def _retry_delay(self, e: HTTPException, attempt: int) -> float:
+        backoff = random.uniform(
+            0, min(self.retry_max, self.retry_base * 2 ** (attempt - 1))
+        )
+        retry_after = (e.headers or {}).get("Retry-After")
+        if retry_after is not None:
+            try:
+                backoff = max(backoff, float(retry_after))
+            except ValueError:
+                pass
+        return min(backoff, self.retry_max)
+
+
+def truncate_partial_line(path: str):
+    """
+    Отрезает строку, оборванную при аварийной остановке, чтобы следующий
+    результат не был дописан к ней.
+    """
+    if not os.path.exists(path):
+        return
+    with open(path, "rb+") as file:
+        end = file.seek(0, os.SEEK_END)
+        position = end
+        while position > 0:
+            size = min(65536, position)
+            file.seek(position - size)
+            block = file.read(size)
+            newline = block.rfind(b"\n")
+            if newline >= 0:
+                position = position - size + newline + 1
+                break
+            position -= size
+        if position < end:
+            logger.warning("Truncating partial line in %s", path)
+            file.truncate(position)
+
+
+def count_records(path: str) -> int:
+    """
+    Число записей JSONL-файла: непустых строк.
+    """
+    with open(path, encoding="utf-8") as file:
+        return sum(1 for line in file if line.strip())
+
+
+def referenced_schema_ids(path: str) -> set:
+    """
+    Собирает schema_id, на которые ссылаются записи JSONL-файла.
+    """
+    schema_ids = set()
+    with open(path, encoding="utf-8") as file:
+        for line in file:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if isinstance(record, dict) and isinstance(record.get("schema_id"), str):
+                schema_ids.add(record["schema_id"])
+    return schema_ids
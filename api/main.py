@@ -1,9 +1,32 @@
+import asyncio
+import json
 import os
+import random
+import time
+from contextlib import asynccontextmanager
+from typing import List, Optional
 
-import requests
+import httpx
 from dotenv import load_dotenv
-from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel
+from fastapi import FastAPI, HTTPException, Request, Response
+from fastapi.responses import JSONResponse, StreamingResponse
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
+from pydantic import BaseModel, model_validator
+
+import metrics
+from admission import AdmissionController, AdmissionRejected
+from breaker import CircuitBreaker, CircuitOpen
+from cache import TranslationCache, translation_key
+from capture import TrafficCapture
+from examples import ExampleStore
+from hedging import Hedger
+from jobs import JobManager
+from protocols import create_protocol
+from routing import Backend, BackendPool
+from schemas import SchemaEntry, SchemaRegistry, build_system_prompt
+from similar_cache import SimilarQuestionCache
+from single_flight import SingleFlight
+from warmup import keep_alive_seconds, keep_warm, parse_keep_alive
 
 load_dotenv()
 
@@ -15,11 +38,297 @@ if not OLLAMA_SERVER_URL or not OLLAMA_MODEL_NAME:
         "Environment variables OLLAMA_SERVER_URL and OLLAMA_MODEL_NAME must be set"
     )
 
-app = FastAPI(title="Ollama SQL Translator API")
+# Протокол сервера модели: ollama (/api/chat) или openai (/v1/chat/completions,
+# например vLLM или llama.cpp server); остальные настройки сохраняют префикс OLLAMA_
+LLM_BACKEND = os.getenv("LLM_BACKEND", "ollama").lower()
+PROTOCOL = create_protocol(LLM_BACKEND)
 
+# OLLAMA_SERVER_URL может содержать несколько серверов через запятую
+OLLAMA_SERVER_URLS = [u.strip() for u in OLLAMA_SERVER_URL.split(",") if u.strip()]
 
-class TranslationRequest(BaseModel):
-    schema: str
+# Проверка доступности серверов Ollama
+HEALTH_CHECK_INTERVAL = float(os.getenv("HEALTH_CHECK_INTERVAL", "10"))
+HEALTH_CHECK_TIMEOUT = float(os.getenv("HEALTH_CHECK_TIMEOUT", "2"))
+BACKEND_MAX_FAILURES = int(os.getenv("BACKEND_MAX_FAILURES", "3"))
+
+# Дублирующие (hedge) запросы на отдельные серверы при долгом ответе основного
+OLLAMA_HEDGE_URLS = [
+    u.strip() for u in os.getenv("OLLAMA_HEDGE_URLS", "").split(",") if u.strip()
+]
+HEDGE_PERCENTILE = float(os.getenv("HEDGE_PERCENTILE", "0.95"))
+HEDGE_MIN_DELAY = float(os.getenv("HEDGE_MIN_DELAY", "1"))
+HEDGE_MAX_RATE = float(os.getenv("HEDGE_MAX_RATE", "0.1"))
+
+# Удержание модели в памяти Ollama: keep_alive в каждом запросе и
+# периодический прогрев чаще, чем истекает keep_alive
+# (число секунд или длительность: "30m", "1h30m"; 0 - выгружать модель сразу
+# после запроса, отрицательное значение - не выгружать)
+OLLAMA_KEEP_ALIVE = parse_keep_alive(os.getenv("OLLAMA_KEEP_ALIVE", "30m"))
+# Интервал прогрева по умолчанию - половина keep_alive (не больше 10 минут),
+# при отрицательном keep_alive - 10 минут; при keep_alive=0 прогрев
+# не повторяется (см. warmup.keep_warm)
+KEEP_ALIVE_SECONDS = keep_alive_seconds(OLLAMA_KEEP_ALIVE)
+if KEEP_ALIVE_SECONDS:
+    WARMUP_INTERVAL = float(
+        os.getenv("WARMUP_INTERVAL", str(min(KEEP_ALIVE_SECONDS / 2, 600)))
+    )
+    if WARMUP_INTERVAL >= KEEP_ALIVE_SECONDS:
+        raise RuntimeError(
+            f"WARMUP_INTERVAL ({WARMUP_INTERVAL:g}s) must be shorter than "
+            f"OLLAMA_KEEP_ALIVE ({OLLAMA_KEEP_ALIVE})"
+        )
+else:
+    WARMUP_INTERVAL = float(os.getenv("WARMUP_INTERVAL", "600"))
+WARMUP_TIMEOUT = float(os.getenv("WARMUP_TIMEOUT", "300"))
+
+# Параметры пула соединений и таймаутов для запросов к Ollama
+OLLAMA_POOL_SIZE = int(os.getenv("OLLAMA_POOL_SIZE", "32"))
+OLLAMA_POOL_KEEPALIVE = int(os.getenv("OLLAMA_POOL_KEEPALIVE", "16"))
+OLLAMA_CONNECT_TIMEOUT = float(os.getenv("OLLAMA_CONNECT_TIMEOUT", "5"))
+OLLAMA_READ_TIMEOUT = float(os.getenv("OLLAMA_READ_TIMEOUT", "90"))
+OLLAMA_POOL_TIMEOUT = float(os.getenv("OLLAMA_POOL_TIMEOUT", "30"))
+
+# Детерминированный режим: фиксированные temperature и seed в запросе к Ollama
+OLLAMA_DETERMINISTIC = os.getenv("OLLAMA_DETERMINISTIC", "false").lower() in (
+    "1",
+    "true",
+    "yes",
+)
+OLLAMA_SEED = int(os.getenv("OLLAMA_SEED", "42"))
+
+# Размер контекста: ступени num_ctx, лимит длины ответа и оценка числа токенов
+NUM_CTX_BUCKETS = sorted(
+    int(b)
+    for b in os.getenv("NUM_CTX_BUCKETS", "2048,4096,8192,16384,32768").split(",")
+)
+NUM_PREDICT = int(os.getenv("NUM_PREDICT", "256"))
+PROMPT_CHARS_PER_TOKEN = float(os.getenv("PROMPT_CHARS_PER_TOKEN", "2.5"))
+# Служебные токены шаблона чата на каждое сообщение
+MESSAGE_TOKEN_OVERHEAD = 8
+
+# Кэш результатов перевода (используется только в детерминированном режиме)
+TRANSLATION_CACHE_SIZE = int(os.getenv("TRANSLATION_CACHE_SIZE", "1024"))
+TRANSLATION_CACHE_TTL = float(os.getenv("TRANSLATION_CACHE_TTL", "86400"))
+TRANSLATION_CACHE_PATH = os.getenv("TRANSLATION_CACHE_PATH")
+
+# Кэш переводов близких вопросов (по символьным n-граммам) для каждой схемы;
+# SIMILAR_CACHE_SEED - файлы выборок датасета через запятую для начального заполнения
+SIMILAR_CACHE = os.getenv("SIMILAR_CACHE", "false").lower() in ("1", "true", "yes")
+SIMILAR_CACHE_THRESHOLD = float(os.getenv("SIMILAR_CACHE_THRESHOLD", "0.9"))
+SIMILAR_CACHE_SIZE = int(os.getenv("SIMILAR_CACHE_SIZE", "10000"))
+SIMILAR_CACHE_SEED = [
+    p.strip() for p in os.getenv("SIMILAR_CACHE_SEED", "").split(",") if p.strip()
+]
+
+# Few-shot: файлы выборок датасета через запятую, из которых для вопроса
+# подбираются FEW_SHOT_K близких примеров той же схемы БД
+FEW_SHOT_EXAMPLES = [
+    p.strip() for p in os.getenv("FEW_SHOT_EXAMPLES", "").split(",") if p.strip()
+]
+FEW_SHOT_K = int(os.getenv("FEW_SHOT_K", "3"))
+
+# Запись переводов для регрессионных наборов: каталог, размер очереди
+# в памяти и число записей в одном сжатом сегменте
+CAPTURE_DIR = os.getenv("CAPTURE_DIR")
+CAPTURE_QUEUE_SIZE = int(os.getenv("CAPTURE_QUEUE_SIZE", "10000"))
+CAPTURE_SEGMENT_RECORDS = int(os.getenv("CAPTURE_SEGMENT_RECORDS", "100000"))
+
+# Пакетный перевод: число одновременных запросов к Ollama и размер пакета
+TRANSLATE_BATCH_CONCURRENCY = int(os.getenv("TRANSLATE_BATCH_CONCURRENCY", "4"))
+TRANSLATE_BATCH_MAX_SIZE = int(os.getenv("TRANSLATE_BATCH_MAX_SIZE", "256"))
+
+# Фоновые задания массового перевода: каталог с заданиями и число
+# одновременно переводимых вопросов всех заданий. По умолчанию каталог
+# данных пользователя, а не текущий каталог (рабочая копия репозитория, /app)
+DATA_HOME = os.getenv("XDG_DATA_HOME") or os.path.expanduser("~/.local/share")
+JOBS_DIR = os.path.abspath(
+    os.getenv("JOBS_DIR", os.path.join(DATA_HOME, "text-to-1c", "jobs"))
+)
+JOBS_CONCURRENCY = int(os.getenv("JOBS_CONCURRENCY", "2"))
+# Задержка повтора записи задания при временной ошибке: начальная и наибольшая
+JOBS_RETRY_BASE = float(os.getenv("JOBS_RETRY_BASE", "1"))
+JOBS_RETRY_MAX = float(os.getenv("JOBS_RETRY_MAX", "60"))
+
+# Максимальное число схем БД, хранимых на сервере
+SCHEMA_REGISTRY_SIZE = int(os.getenv("SCHEMA_REGISTRY_SIZE", "256"))
+
+# Сокращение схемы до сущностей, относящихся к вопросу
+SCHEMA_PRUNING = os.getenv("SCHEMA_PRUNING", "false").lower() in (
+    "1",
+    "true",
+    "yes",
+)
+SCHEMA_PRUNING_TOP_K = int(os.getenv("SCHEMA_PRUNING_TOP_K", "3"))
+
+# Допуск к модели: число одновременных запросов, очередь и время ожидания в ней
+ADMISSION_MAX_IN_FLIGHT = int(os.getenv("ADMISSION_MAX_IN_FLIGHT", "4"))
+ADMISSION_MAX_QUEUE = int(os.getenv("ADMISSION_MAX_QUEUE", "32"))
+ADMISSION_MAX_QUEUE_TIME = float(os.getenv("ADMISSION_MAX_QUEUE_TIME", "10"))
+ADMISSION_RETRY_AFTER = int(os.getenv("ADMISSION_RETRY_AFTER", "2"))
+
+# Автомат отключения при недоступности Ollama и повторы при временных ошибках
+BREAKER_FAILURE_THRESHOLD = int(os.getenv("BREAKER_FAILURE_THRESHOLD", "5"))
+BREAKER_RESET_TIMEOUT = float(os.getenv("BREAKER_RESET_TIMEOUT", "10"))
+RETRY_MAX_ATTEMPTS = int(os.getenv("RETRY_MAX_ATTEMPTS", "3"))
+RETRY_BACKOFF_BASE = float(os.getenv("RETRY_BACKOFF_BASE", "0.2"))
+RETRY_BACKOFF_MAX = float(os.getenv("RETRY_BACKOFF_MAX", "2"))
+REQUEST_DEADLINE = float(os.getenv("REQUEST_DEADLINE", "120"))
+
+# Объединение одновременных одинаковых запросов в один вызов Ollama
+SINGLE_FLIGHT = os.getenv("SINGLE_FLIGHT", "true").lower() in ("1", "true", "yes")
+
+
+def create_client(url: str) -> httpx.AsyncClient:
+    return httpx.AsyncClient(
+        base_url=url,
+        limits=httpx.Limits(
+            max_connections=OLLAMA_POOL_SIZE,
+            max_keepalive_connections=OLLAMA_POOL_KEEPALIVE,
+        ),
+        timeout=httpx.Timeout(
+            OLLAMA_READ_TIMEOUT,
+            connect=OLLAMA_CONNECT_TIMEOUT,
+            pool=OLLAMA_POOL_TIMEOUT,
+        ),
+    )
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Создаёт асинхронные HTTP-клиенты с пулом keep-alive соединений для
+    каждого сервера Ollama, фоновую проверку их доступности и прогрев
+    модели при старте приложения; закрывает их при остановке.
+    """
+    app.state.backends = BackendPool(
+        [Backend(url, create_client(url)) for url in OLLAMA_SERVER_URLS],
+        BACKEND_MAX_FAILURES,
+        PROTOCOL.health_path,
+    )
+    app.state.hedge_backends = None
+    app.state.hedger = None
+    pools = [app.state.backends]
+    if OLLAMA_HEDGE_URLS:
+        app.state.hedge_backends = BackendPool(
+            [Backend(url, create_client(url)) for url in OLLAMA_HEDGE_URLS],
+            BACKEND_MAX_FAILURES,
+            PROTOCOL.health_path,
+        )
+        app.state.hedger = Hedger(HEDGE_PERCENTILE, HEDGE_MIN_DELAY, HEDGE_MAX_RATE)
+        pools.append(app.state.hedge_backends)
+    background = [
+        asyncio.create_task(
+            pool.health_check_loop(HEALTH_CHECK_INTERVAL, HEALTH_CHECK_TIMEOUT)
+        )
+        for pool in pools
+    ]
+    app.state.warmed_up = False
+    background.append(
+        asyncio.create_task(
+            keep_warm(
+                app,
+                PROTOCOL,
+                pools,
+                OLLAMA_MODEL_NAME,
+                OLLAMA_KEEP_ALIVE,
+                WARMUP_INTERVAL,
+                WARMUP_TIMEOUT,
+            )
+        )
+    )
+    app.state.schemas = SchemaRegistry(SCHEMA_REGISTRY_SIZE)
+    app.state.single_flight = SingleFlight()
+    app.state.breaker = CircuitBreaker(BREAKER_FAILURE_THRESHOLD, BREAKER_RESET_TIMEOUT)
+    app.state.admission = AdmissionController(
+        ADMISSION_MAX_IN_FLIGHT, ADMISSION_MAX_QUEUE, ADMISSION_MAX_QUEUE_TIME
+    )
+    app.state.cache = None
+    if OLLAMA_DETERMINISTIC and TRANSLATION_CACHE_SIZE > 0:
+        app.state.cache = TranslationCache(
+            TRANSLATION_CACHE_SIZE, TRANSLATION_CACHE_TTL, TRANSLATION_CACHE_PATH
+        )
+    app.state.similar_cache = None
+    if SIMILAR_CACHE:
+        app.state.similar_cache = SimilarQuestionCache(
+            SCHEMA_REGISTRY_SIZE, SIMILAR_CACHE_SIZE, SIMILAR_CACHE_THRESHOLD
+        )
+        for path in SIMILAR_CACHE_SEED:
+            app.state.similar_cache.seed(path)
+    app.state.examples = None
+    if FEW_SHOT_EXAMPLES and FEW_SHOT_K > 0:
+        app.state.examples = ExampleStore()
+        for path in FEW_SHOT_EXAMPLES:
+            app.state.examples.seed(path)
+    app.state.capture = None
+    if CAPTURE_DIR:
+        app.state.capture = TrafficCapture(
+            CAPTURE_DIR, CAPTURE_QUEUE_SIZE, CAPTURE_SEGMENT_RECORDS
+        )
+    app.state.jobs = JobManager(
+        JOBS_DIR,
+        JOBS_CONCURRENCY,
+        app.state.schemas,
+        translate_record,
+        JOBS_RETRY_BASE,
+        JOBS_RETRY_MAX,
+    )
+    app.state.jobs.resume()
+    try:
+        yield
+    finally:
+        await app.state.jobs.aclose()
+        if app.state.capture is not None:
+            await app.state.capture.aclose()
+        for task in background:
+            task.cancel()
+        for pool in pools:
+            await pool.aclose()
+        if app.state.cache is not None:
+            app.state.cache.close()
+
+
+app = FastAPI(title="Ollama SQL Translator API", lifespan=lifespan)
+
+
+@app.middleware("http")
+async def observe_requests(request: Request, call_next):
+    """
+    Учитывает время обработки и число одновременных запросов к API.
+    """
+    metrics.REQUESTS_IN_FLIGHT.inc()
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        metrics.REQUESTS_IN_FLIGHT.dec()
+        # Метка - шаблон маршрута, а не фактический путь: число рядов ограничено
+        route = request.scope.get("route")
+        path = route.path if route is not None else "unmatched"
+        metrics.REQUEST_LATENCY.labels(path, str(status)).observe(
+            time.perf_counter() - start
+        )
+
+
+class SchemaReference(BaseModel):
+    """
+    Схема БД передаётся либо текстом (schema), либо идентификатором
+    ранее зарегистрированной схемы (schema_id).
+    """
+
+    schema: Optional[str] = None
+    schema_id: Optional[str] = None
+
+    @model_validator(mode="after")
+    def check_schema(self):
+        if (self.schema is None) == (self.schema_id is None):
+            raise ValueError("Exactly one of schema or schema_id must be set")
+        return self
+
+
+class TranslationRequest(SchemaReference):
     question: str
 
 
@@ -27,52 +336,708 @@ class TranslationResponse(BaseModel):
     content: str
 
 
-@app.post("/translate", response_model=TranslationResponse)
-async def translate(req: TranslationRequest):
+class BatchTranslationRequest(SchemaReference):
+    questions: List[str]
+
+
+class SchemaRegistrationRequest(BaseModel):
+    schema: str
+
+
+class SchemaRegistrationResponse(BaseModel):
+    schema_id: str
+
+
+class BatchTranslationItem(BaseModel):
+    question: str
+    content: Optional[str] = None
+    error: Optional[str] = None
+    latency_ms: float
+
+
+class BatchTranslationResponse(BaseModel):
+    items: List[BatchTranslationItem]
+
+
+class JobStatus(BaseModel):
+    job_id: str
+    status: str
+    total: int
+    completed: int
+    failed: int
+
+
+def estimate_tokens(messages: list) -> int:
     """
-    Переводит вопрос на SQL-запрос на основе переданной схемы БД.
+    Грубая оценка числа токенов промпта по длине сообщений.
+    Кириллица токенизируется плотнее латиницы, поэтому по умолчанию
+    берётся консервативная оценка 2.5 символа на токен.
     """
-    payload = {
-        "model": OLLAMA_MODEL_NAME,
-        "stream": False,
-        "messages": [
-            {
-                "role": "system",
-                "content": (
-                    "You are a text to SQL query translator. "
-                    "Users will ask you questions in Russian and you will generate a SQL query based on the provided SCHEMA.\n"
-                    f"SCHEMA: {req.schema}"
-                ),
-            },
-            {"role": "user", "content": req.question},
-        ],
-    }
+    chars = sum(len(m["content"]) for m in messages)
+    return int(chars / PROMPT_CHARS_PER_TOKEN) + MESSAGE_TOKEN_OVERHEAD * len(messages)
+
+
+def context_options(messages: list) -> dict:
+    """
+    Подбирает num_ctx - наименьшую ступень из NUM_CTX_BUCKETS, в которую
+    помещаются промпт и ответ длиной до NUM_PREDICT токенов.
+    Если промпт не помещается даже в наибольшую ступень, возвращает 413.
+    """
+    prompt_tokens = estimate_tokens(messages)
+    metrics.PROMPT_TOKENS_ESTIMATE.observe(prompt_tokens)
+    required = prompt_tokens + NUM_PREDICT
+    for num_ctx in NUM_CTX_BUCKETS:
+        if required <= num_ctx:
+            metrics.NUM_CTX_BUCKET.labels(str(num_ctx)).inc()
+            return {"num_ctx": num_ctx, "num_predict": NUM_PREDICT}
+    metrics.PROMPT_TOO_LARGE.inc()
+    raise HTTPException(
+        status_code=413,
+        detail=(
+            f"Prompt is too large: about {prompt_tokens} tokens, "
+            f"the context window is limited to {NUM_CTX_BUCKETS[-1]} tokens"
+        ),
+    )
+
+
+def build_payload(
+    system_prompt: str, question: str, stream: bool = False, examples: list = ()
+) -> dict:
+    """
+    Формирует тело запроса к серверу модели в формате его протокола.
+    Примеры (вопрос, запрос) передаются парами сообщений user/assistant
+    между системным сообщением и вопросом.
+    """
+    messages = [{"role": "system", "content": system_prompt}]
+    for example_question, example_query in examples:
+        messages.append({"role": "user", "content": example_question})
+        messages.append({"role": "assistant", "content": example_query})
+    messages.append({"role": "user", "content": question})
+    options = context_options(messages)
+    if OLLAMA_DETERMINISTIC:
+        options.update({"temperature": 0, "seed": OLLAMA_SEED})
+    return PROTOCOL.build_payload(
+        OLLAMA_MODEL_NAME, messages, options, OLLAMA_KEEP_ALIVE, stream
+    )
+
+
+class UpstreamError(HTTPException):
+    """
+    Ошибка запроса к Ollama. Временные ошибки (недоступность, таймаут, 5xx)
+    повторяются и учитываются автоматом отключения.
+    """
+
+    def __init__(self, detail: str, transient: bool):
+        super().__init__(status_code=502, detail=detail)
+        self.transient = transient
+
 
+def overloaded(e: AdmissionRejected) -> HTTPException:
+    return HTTPException(
+        status_code=429,
+        detail=f"Translation service is overloaded: {e.reason}",
+        headers={"Retry-After": str(ADMISSION_RETRY_AFTER)},
+    )
+
+
+def circuit_open(e: CircuitOpen) -> HTTPException:
+    return HTTPException(
+        status_code=503,
+        detail="Ollama server is unavailable, circuit breaker is open",
+        headers={"Retry-After": str(int(e.retry_after + 0.5))},
+    )
+
+
+async def call_ollama(payload: dict) -> tuple:
+    """
+    Отправляет запрос серверу Ollama, дождавшись допуска к модели,
+    и возвращает текст ответа модели и поля времени генерации.
+
+    Временные ошибки повторяются с экспоненциальной задержкой со случайным
+    разбросом, пока не исчерпаны RETRY_MAX_ATTEMPTS попыток или
+    REQUEST_DEADLINE секунд. Пока автомат отключения разомкнут,
+    запросы сразу завершаются с кодом 503.
+    """
+    breaker = app.state.breaker
+    deadline = time.monotonic() + REQUEST_DEADLINE
+    attempt = 0
+    while True:
+        attempt += 1
+        try:
+            breaker.before_request()
+        except CircuitOpen as e:
+            raise circuit_open(e)
+        try:
+            async with app.state.admission.slot():
+                remaining = deadline - time.monotonic()
+                result = await request_ollama(payload, remaining)
+        except AdmissionRejected as e:
+            breaker.record_cancelled()
+            raise overloaded(e)
+        except UpstreamError as e:
+            if not e.transient:
+                breaker.record_success()
+                raise
+            breaker.record_failure()
+            backoff = random.uniform(
+                0, min(RETRY_BACKOFF_MAX, RETRY_BACKOFF_BASE * 2 ** (attempt - 1))
+            )
+            if attempt >= RETRY_MAX_ATTEMPTS or (
+                time.monotonic() + backoff >= deadline
+            ):
+                raise
+            metrics.UPSTREAM_RETRIES.inc()
+            await asyncio.sleep(backoff)
+            continue
+        except BaseException:
+            breaker.record_cancelled()
+            raise
+        breaker.record_success()
+        return result
+
+
+async def request_ollama(payload: dict, timeout: float) -> tuple:
+    """
+    Выполняет запрос к серверу Ollama. Если настроены OLLAMA_HEDGE_URLS и
+    основной запрос отвечает дольше обычного, отправляет дублирующий запрос
+    и возвращает первый успешный ответ, отменяя второй запрос.
+    """
+    backends = app.state.backends
+    hedger = app.state.hedger
+    primary_backend = backends.acquire()
+    primary = asyncio.ensure_future(
+        request_backend(backends, primary_backend, payload, timeout)
+    )
+    if hedger is None:
+        return await primary
+
+    tasks = {primary}
     try:
-        response = requests.post(
-            f"{OLLAMA_SERVER_URL}/api/chat", json=payload, timeout=90
+        done, _ = await asyncio.wait(tasks, timeout=hedger.delay())
+        if not done and hedger.allow():
+            hedge_backends = app.state.hedge_backends
+            hedge_backend = hedge_backends.acquire(exclude=primary_backend.url)
+            tasks.add(
+                asyncio.ensure_future(
+                    request_backend(
+                        hedge_backends, hedge_backend, payload, timeout
+                    )
+                )
+            )
+        pending = set(tasks)
+        while True:
+            done, pending = await asyncio.wait(
+                pending, return_when=asyncio.FIRST_COMPLETED
+            )
+            for task in done:
+                if task.exception() is None or not pending:
+                    if task is not primary:
+                        metrics.HEDGE_WINS.inc()
+                    return task.result()
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+async def request_backend(
+    backends: BackendPool, backend: Backend, payload: dict, timeout: float
+) -> tuple:
+    """
+    Отправляет запрос на выбранный сервер Ollama и возвращает текст ответа
+    модели и поля времени генерации.
+    Время ожидания ответа ограничено OLLAMA_READ_TIMEOUT и оставшимся
+    временем запроса timeout.
+    """
+    metrics.UPSTREAM_IN_FLIGHT.inc()
+    start = time.perf_counter()
+    try:
+        response = await backend.client.post(
+            PROTOCOL.chat_path,
+            json=payload,
+            timeout=httpx.Timeout(
+                max(min(OLLAMA_READ_TIMEOUT, timeout), 0.001),
+                connect=OLLAMA_CONNECT_TIMEOUT,
+                pool=OLLAMA_POOL_TIMEOUT,
+            ),
         )
         response.raise_for_status()
-    except requests.RequestException as e:
-        raise HTTPException(
-            status_code=502, detail=f"Error communicating with Ollama server: {e}"
+    except httpx.TimeoutException as e:
+        metrics.UPSTREAM_ERRORS.labels("timeout").inc()
+        backends.report_failure(backend)
+        raise UpstreamError(
+            f"Error communicating with Ollama server: {e}", transient=True
+        )
+    except httpx.HTTPStatusError as e:
+        metrics.UPSTREAM_ERRORS.labels("http_status").inc()
+        transient = e.response.status_code >= 500
+        if transient:
+            backends.report_failure(backend)
+        raise UpstreamError(
+            f"Error communicating with Ollama server: {e}", transient=transient
         )
+    except httpx.HTTPError as e:
+        metrics.UPSTREAM_ERRORS.labels("connection").inc()
+        backends.report_failure(backend)
+        raise UpstreamError(
+            f"Error communicating with Ollama server: {e}", transient=True
+        )
+    except asyncio.CancelledError:
+        # Соединение закрывается, и Ollama прекращает генерацию
+        metrics.UPSTREAM_CANCELLED.inc()
+        raise
     except Exception as e:
+        metrics.UPSTREAM_ERRORS.labels("unexpected").inc()
         raise HTTPException(
             status_code=500, detail=f"{e}"
         )
+    finally:
+        backends.release(backend)
+        metrics.UPSTREAM_IN_FLIGHT.dec()
+        metrics.UPSTREAM_LATENCY.observe(time.perf_counter() - start)
+    elapsed = time.perf_counter() - start
+    backends.report_success(backend)
+    if app.state.hedger is not None:
+        app.state.hedger.record(elapsed)
 
     try:
         data = response.json()
-    except requests.JSONDecodeError as e:
+    except json.JSONDecodeError as e:
+        metrics.UPSTREAM_ERRORS.labels("invalid_json").inc()
         raise HTTPException(
             status_code=500, detail=f"{e}\n{response.text}"
         )
-    
-    assistant_message = data.get("message", {}).get("content")
+
+    assistant_message, timings = PROTOCOL.parse_response(data, int(elapsed * 1e9))
     if assistant_message is None:
+        metrics.UPSTREAM_ERRORS.labels("invalid_response").inc()
         raise HTTPException(
             status_code=500, detail="Invalid response from Ollama server"
         )
+    metrics.observe_upstream_timings(timings)
+    return assistant_message, timings
+
+
+def resolve_schema(req: SchemaReference) -> SchemaEntry:
+    """
+    Возвращает запись схемы из реестра: по schema_id или по тексту схемы.
+    """
+    if req.schema is not None:
+        return app.state.schemas.add(req.schema)
+    entry = app.state.schemas.get(req.schema_id)
+    if entry is None:
+        raise HTTPException(
+            status_code=404, detail=f"Schema {req.schema_id} is not registered"
+        )
+    return entry
+
+
+def system_prompt_for(schema: SchemaEntry, question: str) -> str:
+    """
+    Возвращает системное сообщение для вопроса: с полной схемой или,
+    если включено SCHEMA_PRUNING, только с относящимися к вопросу сущностями.
+    """
+    if not SCHEMA_PRUNING:
+        return schema.system_prompt
+    pruned = schema.index.prune(question, SCHEMA_PRUNING_TOP_K)
+    system_prompt = build_system_prompt(pruned)
+    metrics.PROMPT_CHARS_BEFORE_PRUNING.inc(len(schema.system_prompt))
+    metrics.PROMPT_CHARS_AFTER_PRUNING.inc(len(system_prompt))
+    return system_prompt
+
+
+def examples_for(schema: SchemaEntry, question: str) -> list:
+    """
+    Возвращает few-shot примеры для вопроса, если они загружены.
+    """
+    if app.state.examples is None:
+        return []
+    examples = app.state.examples.select(schema.schema_id, question, FEW_SHOT_K)
+    metrics.FEW_SHOT_EXAMPLES.inc(len(examples))
+    return examples
+
+
+def capture(
+    schema: SchemaEntry,
+    question: str,
+    content: str,
+    source: str,
+    start: float,
+    timings: dict = None,
+):
+    if app.state.capture is not None:
+        app.state.capture.record(
+            schema.schema_id,
+            schema.schema,
+            question,
+            content,
+            source,
+            time.perf_counter() - start,
+            timings,
+        )
+
+
+async def generate(schema: SchemaEntry, question: str, key: str) -> str:
+    """
+    Получает перевод от Ollama и сохраняет его в кэш.
+    """
+    start = time.perf_counter()
+    content, timings = await call_ollama(
+        build_payload(
+            system_prompt_for(schema, question),
+            question,
+            examples=examples_for(schema, question),
+        )
+    )
+    if app.state.cache is not None:
+        await app.state.cache.set(key, content)
+    if app.state.similar_cache is not None:
+        app.state.similar_cache.add(schema.schema_id, question, content)
+    capture(schema, question, content, "model", start, timings)
+    return content
+
+
+async def translate_question(schema: SchemaEntry, question: str) -> str:
+    """
+    Переводит один вопрос с учётом кэша результатов и кэша близких вопросов.
+    Одновременные одинаковые запросы разделяют один вызов Ollama.
+    """
+    start = time.perf_counter()
+    key = translation_key(OLLAMA_MODEL_NAME, schema.schema_id, question)
+    cache = app.state.cache
+    if cache is not None:
+        content = await cache.get(key)
+        metrics.CACHE_REQUESTS.labels("hit" if content is not None else "miss").inc()
+        if content is not None:
+            capture(schema, question, content, "cache", start)
+            return content
+    similar_cache = app.state.similar_cache
+    if similar_cache is not None:
+        content = similar_cache.get(schema.schema_id, question)
+        metrics.SIMILAR_CACHE_REQUESTS.labels(
+            "hit" if content is not None else "miss"
+        ).inc()
+        if content is not None:
+            capture(schema, question, content, "similar_cache", start)
+            return content
+
+    if not SINGLE_FLIGHT:
+        return await generate(schema, question, key)
+    if app.state.single_flight.running(key):
+        metrics.SINGLE_FLIGHT_COALESCED.inc()
+    return await app.state.single_flight.run(
+        key, lambda: generate(schema, question, key)
+    )
+
+
+async def wait_for_disconnect(request: Request):
+    # Тело запроса уже прочитано, следующее сообщение - отключение клиента
+    while True:
+        message = await request.receive()
+        if message["type"] == "http.disconnect":
+            return
+
+
+async def cancel_on_disconnect(request: Request, coro):
+    """
+    Выполняет coro, пока клиент ждёт ответа. Если клиент отключился,
+    выполнение отменяется вместе с запросами к Ollama.
+    """
+    task = asyncio.ensure_future(coro)
+    watcher = asyncio.ensure_future(wait_for_disconnect(request))
+    try:
+        await asyncio.wait({task, watcher}, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        watcher.cancel()
+    if not task.done():
+        task.cancel()
+        metrics.CLIENT_DISCONNECTS.inc()
+        raise HTTPException(status_code=499, detail="Client closed request")
+    return task.result()
+
+
+@app.post("/schemas", response_model=SchemaRegistrationResponse)
+async def register_schema(req: SchemaRegistrationRequest):
+    """
+    Регистрирует схему БД и возвращает её идентификатор (хэш содержимого),
+    который можно передавать в /translate вместо текста схемы.
+    """
+    entry = app.state.schemas.add(req.schema)
+    return SchemaRegistrationResponse(schema_id=entry.schema_id)
+
+
+@app.post("/translate", response_model=TranslationResponse)
+async def translate(req: TranslationRequest, request: Request):
+    """
+    Переводит вопрос на SQL-запрос на основе переданной схемы БД.
+    """
+    schema = resolve_schema(req)
+    content = await cancel_on_disconnect(
+        request, translate_question(schema, req.question)
+    )
+    return TranslationResponse(content=content)
+
+
+@app.post("/translate/batch", response_model=BatchTranslationResponse)
+async def translate_batch(req: BatchTranslationRequest, request: Request):
+    """
+    Переводит список вопросов по одной схеме БД.
+
+    Запросы к Ollama выполняются параллельно, но не более
+    TRANSLATE_BATCH_CONCURRENCY одновременно. Ошибка одного вопроса
+    не прерывает пакет: результаты возвращаются в порядке вопросов.
+    """
+    if len(req.questions) > TRANSLATE_BATCH_MAX_SIZE:
+        raise HTTPException(
+            status_code=413,
+            detail=(
+                f"Batch size exceeds the limit of {TRANSLATE_BATCH_MAX_SIZE} questions"
+            ),
+        )
+
+    schema = resolve_schema(req)
+    semaphore = asyncio.Semaphore(TRANSLATE_BATCH_CONCURRENCY)
+
+    async def run_item(question: str) -> BatchTranslationItem:
+        async with semaphore:
+            start = time.perf_counter()
+            content, error = None, None
+            try:
+                content = await translate_question(schema, question)
+            except HTTPException as e:
+                error = e.detail
+            latency_ms = (time.perf_counter() - start) * 1000
+            return BatchTranslationItem(
+                question=question, content=content, error=error, latency_ms=latency_ms
+            )
+
+    async def run_all() -> list:
+        return await asyncio.gather(*(run_item(q) for q in req.questions))
+
+    items = await cancel_on_disconnect(request, run_all())
+    return BatchTranslationResponse(items=items)
+
+
+@app.post("/translate/stream")
+async def translate_stream(req: TranslationRequest):
+    """
+    Переводит вопрос на SQL-запрос, передавая ответ модели по мере генерации.
 
-    return TranslationResponse(content=assistant_message)
+    Ответ в формате NDJSON: по строке {"content": ...} на каждый фрагмент
+    и итоговая строка {"done": true, "content": <весь запрос>, ...}
+    с полями времени генерации от Ollama.
+    """
+    schema = resolve_schema(req)
+    payload = build_payload(
+        system_prompt_for(schema, req.question),
+        req.question,
+        stream=True,
+        examples=examples_for(schema, req.question),
+    )
+
+    breaker = app.state.breaker
+    try:
+        breaker.before_request()
+    except CircuitOpen as e:
+        raise circuit_open(e)
+
+    admission = app.state.admission
+    try:
+        await admission.acquire()
+    except AdmissionRejected as e:
+        breaker.record_cancelled()
+        raise overloaded(e)
+
+    backends = app.state.backends
+    backend = backends.acquire()
+    client = backend.client
+    start = time.perf_counter()
+    try:
+        response = await client.send(
+            client.build_request("POST", PROTOCOL.chat_path, json=payload),
+            stream=True,
+        )
+    except httpx.HTTPError as e:
+        admission.release()
+        backends.release(backend)
+        backends.report_failure(backend)
+        breaker.record_failure()
+        reason = "timeout" if isinstance(e, httpx.TimeoutException) else "connection"
+        metrics.UPSTREAM_ERRORS.labels(reason).inc()
+        raise HTTPException(
+            status_code=502, detail=f"Error communicating with Ollama server: {e}"
+        )
+    if response.is_error:
+        metrics.UPSTREAM_ERRORS.labels("http_status").inc()
+        admission.release()
+        backends.release(backend)
+        if response.status_code >= 500:
+            backends.report_failure(backend)
+            breaker.record_failure()
+        else:
+            breaker.record_success()
+        await response.aread()
+        await response.aclose()
+        raise HTTPException(
+            status_code=502,
+            detail=(
+                "Error communicating with Ollama server: "
+                f"{response.status_code} {response.text}"
+            ),
+        )
+    breaker.record_success()
+
+    async def events():
+        parts = []
+        parser = PROTOCOL.stream_parser()
+        metrics.UPSTREAM_IN_FLIGHT.inc()
+        try:
+            async for line in response.aiter_lines():
+                event = parser.feed(line)
+                if event is None:
+                    continue
+                if event.error is not None:
+                    metrics.UPSTREAM_ERRORS.labels("stream_error").inc()
+                    yield json.dumps({"error": event.error}, ensure_ascii=False) + "\n"
+                    return
+                if event.content:
+                    parts.append(event.content)
+                    chunk = {"content": event.content}
+                    yield json.dumps(chunk, ensure_ascii=False) + "\n"
+                if event.done:
+                    metrics.observe_upstream_timings(event.timings)
+                    content = "".join(parts)
+                    capture(
+                        schema, req.question, content, "model", start, event.timings
+                    )
+                    final = {"done": True, "content": content, **event.timings}
+                    yield json.dumps(final, ensure_ascii=False) + "\n"
+                    return
+        except asyncio.CancelledError:
+            # Клиент отключился: закрываем поток, и Ollama прекращает генерацию
+            metrics.CLIENT_DISCONNECTS.inc()
+            metrics.UPSTREAM_CANCELLED.inc()
+            raise
+        except (httpx.HTTPError, json.JSONDecodeError) as e:
+            metrics.UPSTREAM_ERRORS.labels("stream_error").inc()
+            yield json.dumps({"error": f"{e}"}, ensure_ascii=False) + "\n"
+        finally:
+            metrics.UPSTREAM_IN_FLIGHT.dec()
+            metrics.UPSTREAM_LATENCY.observe(time.perf_counter() - start)
+            admission.release()
+            backends.release(backend)
+            await response.aclose()
+
+    return StreamingResponse(events(), media_type="application/x-ndjson")
+
+
+async def translate_record(record: dict) -> str:
+    """
+    Переводит запись задания {"schema" | "schema_id", "question"}.
+    """
+    req = TranslationRequest.model_validate(record)
+    return await translate_question(resolve_schema(req), req.question)
+
+
+def get_job(job_id: str):
+    job = app.state.jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+    return job
+
+
+@app.post("/jobs", response_model=JobStatus, status_code=202)
+async def create_job(request: Request):
+    """
+    Создаёт задание на массовый перевод. Тело запроса - JSONL, по строке
+    {"schema" | "schema_id", "question"} на вопрос. Задание выполняется
+    в фоне; ход выполнения - GET /jobs/{job_id}, результаты -
+    GET /jobs/{job_id}/results.
+    """
+    job = await app.state.jobs.create(request.stream())
+    return JobStatus(**job.to_dict())
+
+
+@app.get("/jobs/{job_id}", response_model=JobStatus)
+async def job_status(job_id: str):
+    return JobStatus(**get_job(job_id).to_dict())
+
+
+@app.get("/jobs/{job_id}/results")
+async def job_results(job_id: str):
+    """
+    Возвращает готовые результаты задания в формате JSONL:
+    {"index", "question", "content"} или {"index", "question", "error"}.
+    Порядок строк - порядок завершения, index - номер строки во входном файле.
+    """
+    job = get_job(job_id)
+
+    def lines():
+        if not os.path.exists(job.results_path):
+            return
+        with open(job.results_path, encoding="utf-8") as file:
+            for line in file:
+                # Строку, которая ещё дописывается, не отдаём
+                if line.endswith("\n"):
+                    yield line
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+
+@app.get("/cache/stats")
+async def cache_stats():
+    """
+    Возвращает счётчики попаданий и промахов кэша переводов.
+    """
+    stats = {"enabled": app.state.cache is not None}
+    if app.state.cache is not None:
+        stats.update(app.state.cache.stats())
+    if app.state.similar_cache is not None:
+        stats["similar"] = app.state.similar_cache.stats()
+    return stats
+
+
+async def model_loaded(backend: Backend) -> bool:
+    """
+    Проверяет, что модель OLLAMA_MODEL_NAME загружена на сервере.
+    """
+    try:
+        return await PROTOCOL.model_loaded(
+            backend.client, OLLAMA_MODEL_NAME, HEALTH_CHECK_TIMEOUT
+        )
+    except (httpx.HTTPError, json.JSONDecodeError):
+        return False
+
+
+@app.get("/healthz")
+async def healthz():
+    """
+    Проверка жизнеспособности: процесс API работает.
+    """
+    return {"status": "ok"}
+
+
+@app.get("/readyz")
+async def readyz():
+    """
+    Проверка готовности: прогрев модели завершён, автомат отключения
+    не разомкнут и модель загружена хотя бы на одном доступном сервере Ollama.
+    """
+    breaker = app.state.breaker
+    backends = [b for b in app.state.backends.backends if b.healthy]
+    loaded = await asyncio.gather(*(model_loaded(b) for b in backends))
+    ready = app.state.warmed_up and not breaker.is_open and any(loaded)
+    body = {
+        "ready": ready,
+        "warmed_up": app.state.warmed_up,
+        "circuit_breaker": breaker.state,
+        "model_loaded": {b.url: flag for b, flag in zip(backends, loaded)},
+    }
+    return JSONResponse(status_code=200 if ready else 503, content=body)
+
+
+@app.get("/metrics")
+async def prometheus_metrics():
+    """
+    Возвращает метрики в формате Prometheus.
+    """
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
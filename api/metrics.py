@@ -0,0 +1,193 @@
+from prometheus_client import Counter, Gauge, Histogram
+
+# Границы корзин для длительности генерации: от долей секунды до таймаута
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2, 4, 8, 15, 30, 60, 90)
+
+# load_duration выше порога означает, что Ollama загружала модель в память
+MODEL_LOAD_THRESHOLD = 1.0
+
+REQUEST_LATENCY = Histogram(
+    "api_request_duration_seconds",
+    "Время обработки HTTP-запроса к API",
+    ["path", "status"],
+    buckets=LATENCY_BUCKETS,
+)
+REQUESTS_IN_FLIGHT = Gauge(
+    "api_requests_in_flight", "Число HTTP-запросов к API в обработке"
+)
+
+UPSTREAM_LATENCY = Histogram(
+    "ollama_request_duration_seconds",
+    "Время запроса к серверу Ollama",
+    buckets=LATENCY_BUCKETS,
+)
+UPSTREAM_IN_FLIGHT = Gauge(
+    "ollama_requests_in_flight", "Число запросов к серверу Ollama в обработке"
+)
+UPSTREAM_ERRORS = Counter(
+    "ollama_errors_total", "Ошибки запросов к серверу Ollama", ["reason"]
+)
+
+PROMPT_TOKENS = Counter(
+    "ollama_prompt_tokens_total", "Токены промптов (prompt_eval_count)"
+)
+GENERATED_TOKENS = Counter(
+    "ollama_generated_tokens_total", "Сгенерированные токены (eval_count)"
+)
+PROMPT_EVAL_DURATION = Histogram(
+    "ollama_prompt_eval_duration_seconds",
+    "Время обработки промпта (prompt_eval_duration)",
+    buckets=LATENCY_BUCKETS,
+)
+EVAL_DURATION = Histogram(
+    "ollama_eval_duration_seconds",
+    "Время генерации ответа (eval_duration)",
+    buckets=LATENCY_BUCKETS,
+)
+LOAD_DURATION = Histogram(
+    "ollama_load_duration_seconds",
+    "Время загрузки модели (load_duration)",
+    buckets=LATENCY_BUCKETS,
+)
+TOKENS_PER_SECOND = Histogram(
+    "ollama_generation_tokens_per_second",
+    "Скорость генерации (eval_count / eval_duration)",
+    buckets=(1, 5, 10, 20, 40, 60, 80, 100, 150, 200, 400),
+)
+MODEL_LOADS = Counter(
+    "ollama_model_loads_total", "Запросы, во время которых модель загружалась"
+)
+
+CACHE_REQUESTS = Counter(
+    "translation_cache_requests_total", "Обращения к кэшу переводов", ["result"]
+)
+SIMILAR_CACHE_REQUESTS = Counter(
+    "similar_cache_requests_total",
+    "Поиск близкого вопроса в кэше переводов",
+    ["result"],
+)
+FEW_SHOT_EXAMPLES = Counter(
+    "few_shot_examples_total", "Few-shot примеры, добавленные в промпты"
+)
+SINGLE_FLIGHT_COALESCED = Counter(
+    "single_flight_coalesced_total",
+    "Запросы, присоединившиеся к уже выполняющемуся вызову Ollama",
+)
+PROMPT_CHARS_BEFORE_PRUNING = Counter(
+    "schema_pruning_prompt_chars_before_total",
+    "Размер системных сообщений до сокращения схемы (символы)",
+)
+PROMPT_CHARS_AFTER_PRUNING = Counter(
+    "schema_pruning_prompt_chars_after_total",
+    "Размер системных сообщений после сокращения схемы (символы)",
+)
+
+ADMISSION_QUEUE_DEPTH = Gauge(
+    "admission_queue_depth", "Число запросов, ожидающих доступа к модели"
+)
+ADMISSION_WAIT = Histogram(
+    "admission_wait_seconds",
+    "Время ожидания доступа к модели в очереди",
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10, 30),
+)
+ADMISSION_REJECTED = Counter(
+    "admission_rejected_total", "Запросы, отклонённые с кодом 429", ["reason"]
+)
+
+BACKEND_REQUESTS = Counter(
+    "backend_requests_total", "Запросы, направленные на сервер Ollama", ["backend"]
+)
+BACKEND_OUTSTANDING = Gauge(
+    "backend_outstanding_requests",
+    "Число выполняющихся запросов на сервере Ollama",
+    ["backend"],
+)
+BACKEND_HEALTHY = Gauge(
+    "backend_healthy", "Сервер Ollama участвует в маршрутизации (1/0)", ["backend"]
+)
+BACKEND_EJECTIONS = Counter(
+    "backend_ejections_total", "Исключения сервера Ollama из маршрутизации", ["backend"]
+)
+
+HEDGE_REQUESTS = Counter(
+    "hedge_requests_total", "Отправленные дублирующие (hedge) запросы"
+)
+HEDGE_WINS = Counter(
+    "hedge_wins_total", "Дублирующие запросы, ответившие раньше основных"
+)
+HEDGE_SKIPPED = Counter(
+    "hedge_skipped_total", "Дублирующие запросы, не отправленные из-за лимита доли"
+)
+
+CLIENT_DISCONNECTS = Counter(
+    "client_disconnects_total", "Запросы, клиент которых отключился до ответа"
+)
+UPSTREAM_CANCELLED = Counter(
+    "ollama_cancelled_total", "Запросы к серверу Ollama, прерванные до ответа"
+)
+
+PROMPT_TOKENS_ESTIMATE = Histogram(
+    "prompt_tokens_estimate",
+    "Оценка числа токенов промпта перед отправкой в Ollama",
+    buckets=(256, 512, 1024, 2048, 4096, 8192, 16384, 32768),
+)
+NUM_CTX_BUCKET = Counter(
+    "num_ctx_bucket_total", "Выбранный размер контекстного окна (num_ctx)", ["num_ctx"]
+)
+PROMPT_TOO_LARGE = Counter(
+    "prompt_too_large_total", "Запросы, отклонённые с кодом 413: промпт не помещается"
+)
+
+BREAKER_STATE = Gauge(
+    "circuit_breaker_state",
+    "Состояние автомата: 0 - замкнут, 1 - пробный запрос, 2 - разомкнут",
+)
+BREAKER_OPENED = Counter("circuit_breaker_opened_total", "Размыкания автомата")
+BREAKER_REJECTED = Counter(
+    "circuit_breaker_rejected_total", "Запросы, отклонённые разомкнутым автоматом"
+)
+UPSTREAM_RETRIES = Counter(
+    "ollama_retries_total", "Повторные запросы к Ollama после временных ошибок"
+)
+
+WARMUPS = Counter(
+    "model_warmups_total", "Прогревы модели на серверах Ollama", ["backend", "result"]
+)
+
+CAPTURE_RECORDS = Counter(
+    "traffic_capture_records_total",
+    "Записи переводов: записанные, отброшенные при заполненной очереди, с ошибкой",
+    ["result"],
+)
+JOB_RECORDS = Counter(
+    "translation_job_records_total",
+    "Обработанные записи заданий (retry - повторы после временной ошибки)",
+    ["result"],
+)
+
+
+def observe_upstream_timings(data: dict):
+    """
+    Учитывает поля времени и числа токенов из ответа сервера модели
+    в формате Ollama (длительности в нс).
+    """
+    prompt_eval_count = data.get("prompt_eval_count")
+    if prompt_eval_count is not None:
+        PROMPT_TOKENS.inc(prompt_eval_count)
+    eval_count = data.get("eval_count")
+    if eval_count is not None:
+        GENERATED_TOKENS.inc(eval_count)
+    if data.get("prompt_eval_duration") is not None:
+        PROMPT_EVAL_DURATION.observe(data["prompt_eval_duration"] / 1e9)
+    eval_duration = data.get("eval_duration")
+    if eval_duration is not None:
+        EVAL_DURATION.observe(eval_duration / 1e9)
+    # Без eval_duration скорость оценивается по полному времени запроса
+    generation_time = eval_duration or data.get("total_duration")
+    if eval_count and generation_time:
+        TOKENS_PER_SECOND.observe(eval_count / (generation_time / 1e9))
+    load_duration = data.get("load_duration")
+    if load_duration is not None:
+        LOAD_DURATION.observe(load_duration / 1e9)
+        if load_duration / 1e9 > MODEL_LOAD_THRESHOLD:
+            MODEL_LOADS.inc()
@@ -0,0 +1,221 @@
+import json
+import time
+from typing import Optional
+
+import httpx
+
+
+class StreamEvent:
+    """
+    Разобранная строка потокового ответа сервера модели.
+    """
+
+    def __init__(
+        self,
+        content: str = "",
+        done: bool = False,
+        timings: Optional[dict] = None,
+        error: Optional[str] = None,
+    ):
+        self.content = content
+        self.done = done
+        self.timings = timings or {}
+        self.error = error
+
+
+class OllamaProtocol:
+    """
+    API Ollama: /api/chat, потоковый ответ в формате NDJSON.
+
+    Поля времени и числа токенов берутся из ответа как есть
+    (prompt_eval_count, eval_count, *_duration в наносекундах).
+    """
+
+    name = "ollama"
+    chat_path = "/api/chat"
+    health_path = "/api/tags"
+
+    TIMING_FIELDS = (
+        "total_duration",
+        "load_duration",
+        "prompt_eval_count",
+        "prompt_eval_duration",
+        "eval_count",
+        "eval_duration",
+    )
+
+    def build_payload(
+        self, model: str, messages: list, options: dict, keep_alive, stream: bool
+    ) -> dict:
+        return {
+            "model": model,
+            "stream": stream,
+            "messages": messages,
+            "options": options,
+            "keep_alive": keep_alive,
+        }
+
+    def parse_response(self, data: dict, elapsed_ns: int):
+        """
+        Возвращает текст ответа модели (или None) и поля времени.
+        """
+        content = data.get("message", {}).get("content")
+        timings = {f: data[f] for f in self.TIMING_FIELDS if f in data}
+        return content, timings
+
+    def stream_parser(self):
+        return OllamaStreamParser(self.TIMING_FIELDS)
+
+    async def model_loaded(self, client: httpx.AsyncClient, model: str, timeout: float):
+        """
+        Проверяет по /api/ps, что модель загружена в память сервера.
+        """
+        response = await client.get("/api/ps", timeout=timeout)
+        response.raise_for_status()
+        models = response.json().get("models", [])
+        # Ollama добавляет к имени тег ":latest", если он не указан
+        names = {model, f"{model}:latest"}
+        return any(m.get("name") in names or m.get("model") in names for m in models)
+
+    async def warm_up(
+        self, client: httpx.AsyncClient, model: str, keep_alive, timeout: float
+    ):
+        """
+        Запрос к /api/chat без сообщений только загружает модель
+        и продлевает keep_alive.
+        """
+        payload = {"model": model, "messages": [], "keep_alive": keep_alive}
+        response = await client.post(self.chat_path, json=payload, timeout=timeout)
+        response.raise_for_status()
+
+
+class OllamaStreamParser:
+    def __init__(self, timing_fields: tuple):
+        self.timing_fields = timing_fields
+
+    def feed(self, line: str) -> Optional[StreamEvent]:
+        if not line.strip():
+            return None
+        chunk = json.loads(line)
+        if "error" in chunk:
+            return StreamEvent(error=chunk["error"])
+        content = chunk.get("message", {}).get("content", "")
+        if not chunk.get("done"):
+            return StreamEvent(content=content)
+        timings = {f: chunk[f] for f in self.timing_fields if f in chunk}
+        return StreamEvent(content=content, done=True, timings=timings)
+
+
+class OpenAIProtocol:
+    """
+    OpenAI-совместимый API (/v1/chat/completions) серверов с непрерывным
+    батчингом: vLLM, llama.cpp server и др. Потоковый ответ в формате SSE.
+
+    Число токенов берётся из usage и приводится к полям Ollama
+    (prompt_eval_count, eval_count). Длительности сервер не сообщает,
+    поэтому total_duration - измеренное время запроса, а в потоке
+    prompt_eval_duration - время до первого фрагмента, eval_duration -
+    время от первого до последнего фрагмента.
+    """
+
+    name = "openai"
+    chat_path = "/v1/chat/completions"
+    health_path = "/v1/models"
+
+    def build_payload(
+        self, model: str, messages: list, options: dict, keep_alive, stream: bool
+    ) -> dict:
+        # num_ctx задаётся при запуске сервера, keep_alive не поддерживается
+        payload = {
+            "model": model,
+            "stream": stream,
+            "messages": messages,
+            "max_tokens": options["num_predict"],
+        }
+        for option in ("temperature", "seed"):
+            if option in options:
+                payload[option] = options[option]
+        if stream:
+            payload["stream_options"] = {"include_usage": True}
+        return payload
+
+    def parse_response(self, data: dict, elapsed_ns: int):
+        choices = data.get("choices") or [{}]
+        content = choices[0].get("message", {}).get("content")
+        timings = usage_timings(data.get("usage"))
+        timings["total_duration"] = elapsed_ns
+        return content, timings
+
+    def stream_parser(self):
+        return OpenAIStreamParser()
+
+    async def model_loaded(self, client: httpx.AsyncClient, model: str, timeout: float):
+        """
+        Проверяет по /v1/models, что сервер обслуживает модель.
+        """
+        response = await client.get("/v1/models", timeout=timeout)
+        response.raise_for_status()
+        return any(m.get("id") == model for m in response.json().get("data", []))
+
+    async def warm_up(
+        self, client: httpx.AsyncClient, model: str, keep_alive, timeout: float
+    ):
+        # Такие серверы держат модель загруженной постоянно,
+        # достаточно убедиться, что она доступна
+        if not await self.model_loaded(client, model, timeout):
+            raise httpx.HTTPError(f"Model {model} is not served")
+
+
+class OpenAIStreamParser:
+    def __init__(self):
+        self.start = time.perf_counter_ns()
+        self.first_chunk = None
+        self.last_chunk = None
+        self.usage = None
+
+    def feed(self, line: str) -> Optional[StreamEvent]:
+        if not line.startswith("data:"):
+            return None
+        data = line[len("data:"):].strip()
+        if data == "[DONE]":
+            timings = usage_timings(self.usage)
+            now = time.perf_counter_ns()
+            timings["total_duration"] = now - self.start
+            if self.first_chunk is not None:
+                timings["prompt_eval_duration"] = self.first_chunk - self.start
+                timings["eval_duration"] = self.last_chunk - self.first_chunk
+            return StreamEvent(done=True, timings=timings)
+        chunk = json.loads(data)
+        if "error" in chunk:
+            return StreamEvent(error=str(chunk["error"]))
+        if chunk.get("usage"):
+            self.usage = chunk["usage"]
+        choices = chunk.get("choices") or [{}]
+        content = choices[0].get("delta", {}).get("content") or ""
+        if content:
+            now = time.perf_counter_ns()
+            if self.first_chunk is None:
+                self.first_chunk = now
+            self.last_chunk = now
+        return StreamEvent(content=content)
+
+
+def usage_timings(usage: Optional[dict]) -> dict:
+    if not usage:
+        return {}
+    return {
+        "prompt_eval_count": usage.get("prompt_tokens", 0),
+        "eval_count": usage.get("completion_tokens", 0),
+    }
+
+
+PROTOCOLS = {OllamaProtocol.name: OllamaProtocol, OpenAIProtocol.name: OpenAIProtocol}
+
+
+def create_protocol(name: str):
+    try:
+        return PROTOCOLS[name]()
+    except KeyError:
+        raise RuntimeError(
+            f"Unknown LLM_BACKEND {name!r}, expected one of: {', '.join(PROTOCOLS)}"
+        )
@@ -0,0 +1,97 @@
+import asyncio
+import logging
+
+import httpx
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class Backend:
+    """
+    Сервер модели со своим пулом соединений и состоянием для маршрутизации.
+    """
+
+    def __init__(self, url: str, client: httpx.AsyncClient):
+        self.url = url
+        self.client = client
+        self.outstanding = 0
+        self.healthy = True
+        self.failures = 0
+        metrics.BACKEND_HEALTHY.labels(url).set(1)
+
+
+class BackendPool:
+    """
+    Набор серверов Ollama с маршрутизацией на сервер с наименьшим числом
+    выполняющихся запросов.
+
+    Сервер исключается из маршрутизации после max_failures подряд
+    неудачных запросов или проверок и возвращается после первой
+    успешной проверки доступности.
+    """
+
+    def __init__(self, backends: list, max_failures: int, health_path: str):
+        self.backends = backends
+        self.max_failures = max_failures
+        self.health_path = health_path
+
+    def acquire(self, exclude: str = None) -> Backend:
+        backends = [b for b in self.backends if b.url != exclude] or self.backends
+        candidates = [b for b in backends if b.healthy]
+        if not candidates:
+            # Все серверы исключены - пробуем все, а не отказываем сразу
+            candidates = backends
+        backend = min(candidates, key=lambda b: b.outstanding)
+        backend.outstanding += 1
+        metrics.BACKEND_OUTSTANDING.labels(backend.url).set(backend.outstanding)
+        metrics.BACKEND_REQUESTS.labels(backend.url).inc()
+        logger.debug(
+            "Routing request to %s (outstanding: %s)",
+            backend.url,
+            {b.url: b.outstanding for b in self.backends},
+        )
+        return backend
+
+    def release(self, backend: Backend):
+        backend.outstanding -= 1
+        metrics.BACKEND_OUTSTANDING.labels(backend.url).set(backend.outstanding)
+
+    def report_success(self, backend: Backend):
+        backend.failures = 0
+        if not backend.healthy:
+            backend.healthy = True
+            metrics.BACKEND_HEALTHY.labels(backend.url).set(1)
+            logger.info("Backend %s re-admitted", backend.url)
+
+    def report_failure(self, backend: Backend):
+        backend.failures += 1
+        if backend.healthy and backend.failures >= self.max_failures:
+            backend.healthy = False
+            metrics.BACKEND_HEALTHY.labels(backend.url).set(0)
+            metrics.BACKEND_EJECTIONS.labels(backend.url).inc()
+            logger.warning(
+                "Backend %s ejected after %d failures", backend.url, backend.failures
+            )
+
+    async def probe(self, backend: Backend, timeout: float):
+        try:
+            response = await backend.client.get(self.health_path, timeout=timeout)
+            response.raise_for_status()
+        except httpx.HTTPError:
+            self.report_failure(backend)
+        else:
+            self.report_success(backend)
+
+    async def health_check_loop(self, interval: float, timeout: float):
+        """
+        Периодически проверяет доступность всех серверов.
+        """
+        while True:
+            await asyncio.gather(*(self.probe(b, timeout) for b in self.backends))
+            await asyncio.sleep(interval)
+
+    async def aclose(self):
+        for backend in self.backends:
+            await backend.client.aclose()
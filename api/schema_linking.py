@@ -0,0 +1,109 @@
+import math
+import re
+from collections import defaultdict
+
+# Слова из имён сущностей, не несущие смысла для сопоставления с вопросом
+STOP_WORDS = {"справочник", "регистрсведений", "ссылка", "наименование"}
+
+
+def split_words(text: str) -> list:
+    """
+    Разбивает текст на слова в нижнем регистре, в том числе
+    имена в стиле CamelCase: "КоличествоПлатформ" -> ["количество", "платформ"].
+    """
+    words = re.findall(r"[A-ZА-ЯЁ]?[a-zа-яё]+|[A-ZА-ЯЁ]+(?![a-zа-яё])|\d+", text)
+    return [w.lower() for w in words]
+
+
+def stem(word: str) -> str:
+    """
+    Грубая основа слова: первые пять символов.
+    Этого достаточно, чтобы "товаров" и "товары" совпадали.
+    """
+    return word[:5]
+
+
+def text_stems(text: str) -> set:
+    return {stem(w) for w in split_words(text) if len(w) > 2 and w not in STOP_WORDS}
+
+
+class SchemaIndex:
+    """
+    Лексический индекс по именам сущностей и полей одной схемы БД.
+
+    Сущность оценивается суммой весов IDF основ из вопроса, совпавших
+    с основами её имени (с удвоенным весом) и имён её полей.
+    """
+
+    def __init__(self, entities: dict):
+        self.entities = entities
+        self.name_stems = {}
+        self.field_stems = {}
+        document_frequency = defaultdict(int)
+        for entity, fields in entities.items():
+            name = entity.split(".", 1)[-1]
+            self.name_stems[entity] = text_stems(name)
+            self.field_stems[entity] = set()
+            for field in fields:
+                self.field_stems[entity] |= text_stems(field)
+            for s in self.name_stems[entity] | self.field_stems[entity]:
+                document_frequency[s] += 1
+        n = max(len(entities), 1)
+        self.idf = {s: math.log(1 + n / df) for s, df in document_frequency.items()}
+
+    def score(self, question: str) -> dict:
+        question_stems = text_stems(question)
+        scores = {}
+        for entity in self.entities:
+            name_hits = question_stems & self.name_stems[entity]
+            field_hits = question_stems & self.field_stems[entity]
+            scores[entity] = 2 * sum(self.idf[s] for s in name_hits) + sum(
+                self.idf[s] for s in field_hits
+            )
+        return scores
+
+    def referenced(self, entity: str) -> set:
+        """
+        Возвращает сущности схемы, на которые ссылаются поля сущности.
+        """
+        return {
+            t
+            for t in self.entities[entity].values()
+            if t in self.entities and t != entity
+        }
+
+    def prune(self, question: str, top_k: int) -> str:
+        """
+        Оставляет top_k наиболее подходящих к вопросу сущностей, сущности,
+        на которые они ссылаются, и регистры, связывающие выбранные сущности.
+        Если ни одна сущность не подошла, возвращается вся схема.
+        """
+        scores = self.score(question)
+        ranked = sorted(
+            (e for e in self.entities if scores[e] > 0), key=lambda e: -scores[e]
+        )
+        if not ranked:
+            return format_schema(self.entities)
+
+        selected = set(ranked[:top_k])
+        for entity in list(selected):
+            selected |= self.referenced(entity)
+        for entity in self.entities:
+            refs = self.referenced(entity)
+            if len(refs) >= 2 and refs <= selected:
+                selected.add(entity)
+
+        return format_schema(
+            {e: fields for e, fields in self.entities.items() if e in selected}
+        )
+
+
+def format_schema(entities: dict) -> str:
+    """
+    Собирает схему обратно в формат "Справочник.X : Поле (Тип) , ... | ...".
+    """
+    return " | ".join(
+        f"{entity} : "
+        + " , ".join(f"{name} ({type_})" for name, type_ in fields.items())
+        for entity, fields in entities.items()
+    )
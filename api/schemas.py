@@ -0,0 +1,117 @@
+import json
+import re
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional
+
+from cache import schema_hash
+from schema_linking import SchemaIndex
+
+
+def build_system_prompt(schema: str) -> str:
+    """
+    Формирует системное сообщение для модели с текстом схемы БД.
+    """
+    return (
+        "You are a text to SQL query translator. "
+        "Users will ask you questions in Russian and you will generate a SQL query based on the provided SCHEMA.\n"
+        f"SCHEMA: {schema}"
+    )
+
+
+def load_dataset_pairs(path: str) -> list:
+    """
+    Читает выборку из dataset/create_final_dataset.py (JSONL с сообщениями
+    system, user, assistant) и возвращает список (схема, вопрос, запрос).
+    Схема - текст после "SCHEMA: " в системном сообщении.
+    """
+    pairs = []
+    with open(path, encoding="utf-8") as file:
+        for line in file:
+            if not line.strip():
+                continue
+            messages = {m["role"]: m["content"] for m in json.loads(line)["messages"]}
+            schema = messages["system"].rsplit("SCHEMA: ", 1)[-1]
+            pairs.append((schema, messages["user"], messages["assistant"]))
+    return pairs
+
+
+def parse_entities(entity_str: str) -> dict:
+    """
+    Разбирает схему вида "Справочник.X : Поле (Тип) , ... | ..." в структуру
+    {
+        'Справочник.X': {
+            'Поле': 'Тип'
+        }
+    }
+    Формат тот же, что у parse_entities из dataset/parse_entities_v3.py,
+    но регистр имён сохраняется, чтобы схему можно было собрать обратно.
+    """
+    entities = {}
+    for part in entity_str.strip().split("|"):
+        part = part.strip()
+        if not part:
+            continue
+        entity_match = re.match(r"(.+?)\s*:\s*(.+)", part)
+        if not entity_match:
+            continue
+        entity_name, fields_str = entity_match.groups()
+        field_dict = {}
+        for f in fields_str.split(","):
+            field_match = re.match(r"(.+?)\s*\((.+?)\)", f.strip())
+            if field_match:
+                field_name, field_type = field_match.groups()
+                field_dict[field_name.strip()] = field_type.strip()
+        entities[entity_name.strip()] = field_dict
+    return entities
+
+
+@dataclass
+class SchemaEntry:
+    schema_id: str
+    schema: str
+    system_prompt: str
+    entities: dict
+    index: SchemaIndex
+
+
+class SchemaRegistry:
+    """
+    Хранилище схем БД по идентификатору (хэшу содержимого).
+
+    Для каждой схемы один раз строится системное сообщение, разобранная
+    структура сущностей и лексический индекс для сокращения схемы.
+    Память ограничена числом схем, при переполнении вытесняется
+    давно не использовавшаяся (LRU).
+    """
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+
+    def add(self, schema: str) -> SchemaEntry:
+        schema_id = schema_hash(schema)
+        entry = self.get(schema_id)
+        if entry is not None:
+            return entry
+        entities = parse_entities(schema)
+        entry = SchemaEntry(
+            schema_id=schema_id,
+            schema=schema,
+            system_prompt=build_system_prompt(schema),
+            entities=entities,
+            index=SchemaIndex(entities),
+        )
+        self._entries[schema_id] = entry
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return entry
+
+    def get(self, schema_id: str) -> Optional[SchemaEntry]:
+        entry = self._entries.get(schema_id)
+        if entry is not None:
+            self._entries.move_to_end(schema_id)
+        return entry
+
+    def __len__(self):
+        return len(self._entries)
@@ -0,0 +1,297 @@
+import logging
+import math
+import re
+from collections import Counter, OrderedDict
+from itertools import islice
+from typing import Optional
+
+from cache import normalize_question, schema_hash
+from schemas import load_dataset_pairs
+
+logger = logging.getLogger(__name__)
+
+# Числа и строки в кавычках должны совпадать точно: вопросы
+# "старше 30 лет" и "старше 40 лет" близки, но запросы у них разные
+LITERAL_PATTERN = re.compile(r"\d+(?:[.,]\d+)?|«[^»]*»|\"[^\"]*\"|'[^']*'")
+
+# Отрицания и служебные слова меняют смысл вопроса при почти тех же
+# n-граммах ("которые продают" и "которые не продают"), поэтому должны
+# совпадать точно
+FUNCTION_WORDS = frozenset(
+    [
+        "не",
+        "ни",
+        "нет",
+        "без",
+        "кроме",
+        "никто",
+        "ничего",
+        "никогда",
+        "и",
+        "или",
+        "но",
+        "а",
+        "ли",
+        "только",
+        "до",
+        "после",
+        "больше",
+        "меньше",
+        "более",
+        "менее",
+    ]
+)
+
+
+def question_ngrams(question: str, n: int = 3) -> Counter:
+    """
+    Символьные n-граммы слов нормализованного вопроса.
+
+    Регистр, "ё" и пунктуация не учитываются. N-граммы строятся по каждому
+    слову отдельно (с границами слова), поэтому порядок слов не важен.
+    """
+    text = normalize_question(question).replace("ё", "е")
+    ngrams = Counter()
+    for word in re.findall(r"\w+", text):
+        padded = f" {word} "
+        for i in range(max(len(padded) - n + 1, 1)):
+            ngrams[padded[i:i + n]] += 1
+    return ngrams
+
+
+def question_literals(question: str) -> frozenset:
+    return frozenset(m.lower() for m in LITERAL_PATTERN.findall(question))
+
+
+def question_words(question: str) -> Counter:
+    text = normalize_question(question).replace("ё", "е")
+    return Counter(re.findall(r"\w+", text))
+
+
+def _is_typo(word: str, other: str) -> bool:
+    """
+    Слова отличаются одной опечаткой (заменой, вставкой или удалением
+    буквы) не в окончании: другая форма слова ("магазинов" и "магазины")
+    опечаткой не считается.
+    """
+    if not (word.isalpha() and other.isalpha()) or min(len(word), len(other)) < 4:
+        return False
+    if word[-2:] != other[-2:] or abs(len(word) - len(other)) > 1:
+        return False
+    if len(word) == len(other):
+        return sum(a != b for a, b in zip(word, other)) == 1
+    shorter, longer = sorted((word, other), key=len)
+    pairs = enumerate(zip(shorter, longer))
+    i = next((i for i, (a, b) in pairs if a != b), len(shorter))
+    return shorter[i:] == longer[i + 1:]
+
+
+def same_words(words: Counter, other: Counter) -> bool:
+    """
+    Совпадают ли слова вопросов без учёта порядка, с точностью до опечаток.
+
+    Каждое слово, которого нет в другом вопросе, должно быть опечаткой
+    своего слова другого вопроса; отрицания и служебные слова (FUNCTION_WORDS)
+    должны совпадать точно. Так отвергаются вопросы с добавленным "не"
+    и вопросы, в которых слова поменялись ролями ("магазины, продающие
+    товары" и "товары, продающие магазины").
+    """
+    extra, missing = words - other, other - words
+    if sum(extra.values()) != sum(missing.values()):
+        return False
+    if any(word in FUNCTION_WORDS for word in (extra + missing)):
+        return False
+    remaining = list(missing.elements())
+    for word in extra.elements():
+        match = next((other for other in remaining if _is_typo(word, other)), None)
+        if match is None:
+            return False
+        remaining.remove(match)
+    return True
+
+
+class SimilarQuestionIndex:
+    """
+    Инвертированный индекс n-грамм вопросов одной схемы БД.
+
+    Близость вопросов - косинусная мера векторов частот n-грамм. Поиск
+    выполняется в цикле событий, поэтому его время ограничено независимо
+    от размера индекса: кандидаты отбираются по спискам вхождений самых
+    редких n-грамм вопроса (всего не больше max_postings вхождений),
+    точная близость вычисляется только для max_candidates кандидатов
+    с наибольшим числом общих редких n-грамм. Вопрос с близостью
+    не ниже порога кэша содержит почти все n-граммы сохранённого,
+    в том числе редкие, и попадает в кандидаты.
+    Размер ограничен max_entries, вытесняется давно не использовавшийся вопрос;
+    при max_entries=None индекс не ограничен (примеры few-shot).
+    """
+
+    def __init__(
+        self,
+        max_entries: Optional[int],
+        max_postings: int = 2000,
+        max_candidates: int = 50,
+    ):
+        self.max_entries = max_entries
+        self.max_postings = max_postings
+        self.max_candidates = max_candidates
+        # id -> (нормализованный вопрос, вопрос, запрос, литералы, норма вектора,
+        # слова)
+        self._entries = OrderedDict()
+        self._ngrams = {}
+        self._postings = {}
+        self._ids = {}
+        self._next_id = 0
+
+    def add(self, question: str, content: str):
+        key = normalize_question(question)
+        if key in self._ids:
+            self._remove(self._ids[key])
+        ngrams = question_ngrams(question)
+        if not ngrams:
+            return
+        entry_id = self._next_id
+        self._next_id += 1
+        norm = math.sqrt(sum(c * c for c in ngrams.values()))
+        literals = question_literals(question)
+        words = question_words(question)
+        self._entries[entry_id] = (key, question, content, literals, norm, words)
+        self._ngrams[entry_id] = ngrams
+        self._ids[key] = entry_id
+        for ngram, count in ngrams.items():
+            self._postings.setdefault(ngram, {})[entry_id] = count
+        while self.max_entries is not None and len(self._entries) > self.max_entries:
+            self._remove(next(iter(self._entries)))
+
+    def similarities(self, question: str) -> dict:
+        """
+        Возвращает близость вопроса к кандидатам - сохранённым вопросам
+        с общими редкими n-граммами (не больше max_candidates).
+        """
+        ngrams = question_ngrams(question)
+        if not ngrams:
+            return {}
+        norm = math.sqrt(sum(c * c for c in ngrams.values()))
+        scores = {}
+        for entry_id in self._candidates(ngrams):
+            entry_ngrams = self._ngrams[entry_id]
+            dot = sum(c * entry_ngrams.get(g, 0) for g, c in ngrams.items())
+            scores[entry_id] = dot / (norm * self._entries[entry_id][4])
+        return scores
+
+    def _candidates(self, ngrams: Counter) -> list:
+        # Частичное скалярное произведение по просмотренным n-граммам,
+        # делённое на норму вектора кандидата: при равном числе общих
+        # n-грамм выше оказывается более короткий вопрос
+        postings = [(g, self._postings[g]) for g in ngrams if g in self._postings]
+        postings.sort(key=lambda item: len(item[1]))
+        partial = Counter()
+        scanned = 0
+        for ngram, entries in postings:
+            # Самый редкий список просматривается всегда, хотя бы частично
+            if scanned and scanned + len(entries) > self.max_postings:
+                break
+            count = ngrams[ngram]
+            for entry_id, entry_count in islice(entries.items(), self.max_postings):
+                partial[entry_id] += count * entry_count
+            scanned += len(entries)
+        for entry_id in partial:
+            partial[entry_id] /= self._entries[entry_id][4]
+        return [entry_id for entry_id, _ in partial.most_common(self.max_candidates)]
+
+    def lookup(self, question: str, threshold: float) -> Optional[tuple]:
+        """
+        Возвращает (запрос, близость) для самого близкого вопроса
+        с близостью не ниже threshold, теми же литералами и теми же словами
+        (см. same_words), иначе None.
+        """
+        literals = question_literals(question)
+        words = question_words(question)
+        best = None
+        for entry_id, score in self.similarities(question).items():
+            entry = self._entries[entry_id]
+            if score < threshold or entry[3] != literals:
+                continue
+            if (best is None or score > best[1]) and same_words(words, entry[5]):
+                best = (entry_id, score)
+        if best is None:
+            return None
+        entry_id, score = best
+        self._entries.move_to_end(entry_id)
+        return self._entries[entry_id][2], score
+
+    def nearest(self, question: str, k: int) -> list:
+        """
+        Возвращает до k пар (вопрос, запрос), ближайших к вопросу.
+        """
+        scores = self.similarities(question)
+        top = sorted(scores, key=scores.get, reverse=True)[:k]
+        return [self._entries[entry_id][1:3] for entry_id in top]
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _remove(self, entry_id: int):
+        key = self._entries.pop(entry_id)[0]
+        del self._ids[key]
+        for ngram in self._ngrams.pop(entry_id):
+            postings = self._postings[ngram]
+            del postings[entry_id]
+            if not postings:
+                del self._postings[ngram]
+
+
+class SimilarQuestionCache:
+    """
+    Кэш переводов по близким вопросам: отдельный индекс на каждую схему БД.
+
+    Дополняет точный кэш: находит ранее переведённый вопрос, отличающийся
+    регистром, пунктуацией, порядком слов или опечатками. Число схем ограничено
+    max_schemas, при переполнении вытесняется давно не использовавшаяся.
+    """
+
+    def __init__(self, max_schemas: int, max_entries: int, threshold: float):
+        self.max_schemas = max_schemas
+        self.max_entries = max_entries
+        self.threshold = threshold
+        self._indexes = OrderedDict()
+
+    def get(self, schema_id: str, question: str) -> Optional[str]:
+        index = self._indexes.get(schema_id)
+        if index is None:
+            return None
+        self._indexes.move_to_end(schema_id)
+        found = index.lookup(question, self.threshold)
+        return found[0] if found is not None else None
+
+    def add(self, schema_id: str, question: str, content: str):
+        index = self._indexes.get(schema_id)
+        if index is None:
+            index = self._indexes[schema_id] = SimilarQuestionIndex(self.max_entries)
+            while len(self._indexes) > self.max_schemas:
+                self._indexes.popitem(last=False)
+        else:
+            self._indexes.move_to_end(schema_id)
+        index.add(question, content)
+
+    def seed(self, path: str):
+        """
+        Заполняет кэш парами вопрос - запрос из выборки датасета
+        (dataset/data/ru_train.json, ru_test.json).
+        """
+        try:
+            pairs = load_dataset_pairs(path)
+        except FileNotFoundError:
+            logger.warning("Similar question cache seed %s not found", path)
+            return
+        for schema, question, query in pairs:
+            self.add(schema_hash(schema), question, query)
+        logger.info(
+            "Seeded similar question cache with %d pairs from %s", len(pairs), path
+        )
+
+    def stats(self) -> dict:
+        return {
+            "schemas": len(self._indexes),
+            "questions": sum(len(i) for i in self._indexes.values()),
+        }
@@ -0,0 +1,46 @@
+import asyncio
+
+
+class SingleFlight:
+    """
+    Объединяет одновременные вызовы с одинаковым ключом в один.
+
+    Первый вызов запускает задачу, остальные ждут её результат или исключение.
+    Задача защищена от отмены: если ожидающий клиент отключился,
+    общий вызов продолжает выполняться для остальных. Когда отключились
+    все ожидающие, задача отменяется.
+    """
+
+    def __init__(self):
+        self._tasks = {}
+        self._waiters = {}
+
+    async def run(self, key: str, factory):
+        task = self._tasks.get(key)
+        if task is None:
+            task = asyncio.ensure_future(factory())
+            self._tasks[key] = task
+            self._waiters[task] = 0
+            task.add_done_callback(lambda t: self._forget(key, t))
+        self._waiters[task] += 1
+        try:
+            return await asyncio.shield(task)
+        finally:
+            if task in self._waiters:
+                self._waiters[task] -= 1
+                if self._waiters[task] == 0 and not task.done():
+                    task.cancel()
+
+    def running(self, key: str) -> bool:
+        return key in self._tasks
+
+    def in_flight(self) -> int:
+        return len(self._tasks)
+
+    def _forget(self, key: str, task: asyncio.Future):
+        if self._tasks.get(key) is task:
+            del self._tasks[key]
+        self._waiters.pop(task, None)
+        # Исключение забираем, чтобы не было предупреждения, если ждать уже некому
+        if not task.cancelled():
+            task.exception()
@@ -0,0 +1,187 @@
+import asyncio
+import json
+import threading
+import time
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+
+
+class StubSettings(BaseModel):
+    # Имитация времени генерации ответа (секунды)
+    delay: float = 0.2
+    model: str = "stub"
+    # Имитация времени загрузки модели при прогреве (секунды)
+    load_delay: float = 0.0
+    content: str = "ВЫБРАТЬ Товары.Наименование ИЗ Справочник.Товары КАК Товары"
+
+
+def create_stub_app(settings: StubSettings = None) -> FastAPI:
+    """
+    Создаёт приложение, имитирующее API Ollama (/api/chat) и OpenAI-совместимый
+    API (/v1/chat/completions) с заданной задержкой.
+    Используется для бенчмарков и проверки API без GPU.
+    """
+    settings = settings or StubSettings()
+    stub = FastAPI(title="Ollama stub")
+    stub.state.settings = settings
+    # Запросы, клиент которых отключился до окончания "генерации"
+    stub.state.aborted = 0
+
+    @stub.get("/api/tags")
+    async def tags():
+        return {"models": [{"name": "stub"}]}
+
+    @stub.get("/api/ps")
+    async def ps():
+        return {"models": [{"name": settings.model, "model": settings.model}]}
+
+    @stub.get("/stub/stats")
+    async def stats():
+        return {"aborted": stub.state.aborted}
+
+    @stub.post("/api/chat")
+    async def chat(payload: dict, request: Request):
+        start = time.perf_counter_ns()
+        if not payload.get("messages"):
+            # Пустой список сообщений - только загрузка модели (прогрев)
+            await asyncio.sleep(settings.load_delay)
+            return {
+                "model": payload.get("model"),
+                "message": {"role": "assistant", "content": ""},
+                "done": True,
+                "done_reason": "load",
+            }
+        if payload.get("stream"):
+            return StreamingResponse(
+                stream_chunks(payload, start), media_type="application/x-ndjson"
+            )
+        if not await generate(request):
+            return {}
+        return {
+            "model": payload.get("model"),
+            "message": {"role": "assistant", "content": settings.content},
+            "done": True,
+            "total_duration": time.perf_counter_ns() - start,
+            "load_duration": 0,
+            "prompt_eval_count": sum(len(m["content"]) for m in payload["messages"])
+            // 4,
+            "eval_count": len(settings.content) // 4,
+            "eval_duration": time.perf_counter_ns() - start,
+        }
+
+    @stub.get("/v1/models")
+    async def models():
+        return {"object": "list", "data": [{"id": settings.model, "object": "model"}]}
+
+    @stub.post("/v1/chat/completions")
+    async def chat_completions(payload: dict, request: Request):
+        prompt_tokens = sum(len(m["content"]) for m in payload["messages"]) // 4
+        if payload.get("stream"):
+            return StreamingResponse(
+                stream_openai_chunks(payload, prompt_tokens),
+                media_type="text/event-stream",
+            )
+        if not await generate(request):
+            return {}
+        return {
+            "object": "chat.completion",
+            "model": payload.get("model"),
+            "choices": [
+                {
+                    "index": 0,
+                    "message": {"role": "assistant", "content": settings.content},
+                    "finish_reason": "stop",
+                }
+            ],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": len(settings.content) // 4,
+            },
+        }
+
+    async def generate(request: Request) -> bool:
+        # "Генерация" идёт шагами, между которыми проверяется отключение клиента
+        deadline = time.perf_counter() + settings.delay
+        while time.perf_counter() < deadline:
+            if await request.is_disconnected():
+                stub.state.aborted += 1
+                return False
+            await asyncio.sleep(min(0.01, max(deadline - time.perf_counter(), 0)))
+        return True
+
+    async def stream_openai_chunks(payload: dict, prompt_tokens: int):
+        words = settings.content.split(" ")
+        for i, word in enumerate(words):
+            await asyncio.sleep(settings.delay / len(words))
+            chunk = {
+                "object": "chat.completion.chunk",
+                "model": payload.get("model"),
+                "choices": [
+                    {"index": 0, "delta": {"content": word if i == 0 else f" {word}"}}
+                ],
+            }
+            yield f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n"
+        usage = {
+            "object": "chat.completion.chunk",
+            "choices": [],
+            "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": len(words)},
+        }
+        yield f"data: {json.dumps(usage)}\n\n"
+        yield "data: [DONE]\n\n"
+
+    async def stream_chunks(payload: dict, start: int):
+        # Ответ выдаётся по словам, задержка распределяется равномерно
+        words = settings.content.split(" ")
+        for i, word in enumerate(words):
+            await asyncio.sleep(settings.delay / len(words))
+            chunk = {
+                "model": payload.get("model"),
+                "message": {
+                    "role": "assistant",
+                    "content": word if i == 0 else f" {word}",
+                },
+                "done": False,
+            }
+            yield json.dumps(chunk, ensure_ascii=False) + "\n"
+        final = {
+            "model": payload.get("model"),
+            "message": {"role": "assistant", "content": ""},
+            "done": True,
+            "total_duration": time.perf_counter_ns() - start,
+            "eval_count": len(words),
+            "eval_duration": time.perf_counter_ns() - start,
+        }
+        yield json.dumps(final) + "\n"
+
+    return stub
+
+
+class ServerThread(threading.Thread):
+    """
+    Запускает uvicorn-сервер с приложением в отдельном потоке.
+    """
+
+    def __init__(self, app, port: int):
+        super().__init__(daemon=True)
+        self.server = uvicorn.Server(
+            uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning")
+        )
+
+    def start(self):
+        super().start()
+        while not self.server.started:
+            time.sleep(0.01)
+
+    def run(self):
+        self.server.run()
+
+    def stop(self):
+        self.server.should_exit = True
+        self.join()
+
+
+if __name__ == "__main__":
+    uvicorn.run(create_stub_app(), host="127.0.0.1", port=11434)
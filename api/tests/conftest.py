@@ -0,0 +1,63 @@
+import importlib
+import os
+import socket
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from stub_ollama import ServerThread, StubSettings, create_stub_app  # noqa: E402
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@pytest.fixture
+def stub_port() -> int:
+    return free_port()
+
+
+@pytest.fixture
+def start_stub(stub_port):
+    """
+    Запускает заглушку сервера модели на stub_port с заданными настройками.
+    """
+    servers = []
+
+    def start(**settings):
+        stub = create_stub_app(StubSettings(**settings))
+        server = ServerThread(stub, stub_port)
+        server.start()
+        servers.append(server)
+        return stub
+
+    yield start
+    for server in servers:
+        server.stop()
+
+
+@pytest.fixture
+def load_api(monkeypatch, tmp_path, stub_port):
+    """
+    Импортирует API заново с переменными окружения теста: настройки
+    читаются из окружения при импорте main.
+    """
+
+    def load(**env):
+        defaults = {
+            "OLLAMA_SERVER_URL": f"http://127.0.0.1:{stub_port}",
+            "OLLAMA_MODEL_NAME": "stub",
+            "JOBS_DIR": str(tmp_path / "jobs"),
+            "HEALTH_CHECK_INTERVAL": "0.2",
+        }
+        for name, value in {**defaults, **env}.items():
+            monkeypatch.setenv(name, str(value))
+        import main
+
+        return importlib.reload(main)
+
+    return load
@@ -0,0 +1,45 @@
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+from prometheus_client import REGISTRY
+
+from stub_ollama import StubSettings
+
+SCHEMA = "Справочник.Товары : Ссылка (Строка)"
+CONTENT = StubSettings().content
+
+
+def token_counts() -> tuple:
+    return (
+        REGISTRY.get_sample_value("ollama_prompt_tokens_total") or 0,
+        REGISTRY.get_sample_value("ollama_generated_tokens_total") or 0,
+    )
+
+
+@pytest.mark.parametrize("backend", ["ollama", "openai"])
+def test_backend_protocol(load_api, start_stub, backend):
+    start_stub(delay=0.05)
+    main = load_api(LLM_BACKEND=backend)
+    with TestClient(main.app) as client:
+        prompt_tokens, generated_tokens = token_counts()
+        response = client.post(
+            "/translate", json={"schema": SCHEMA, "question": "Все товары"}
+        )
+        assert response.status_code == 200
+        assert response.json() == {"content": CONTENT}
+        assert token_counts()[0] > prompt_tokens
+        assert token_counts()[1] > generated_tokens
+
+        generated_tokens = token_counts()[1]
+        with client.stream(
+            "POST",
+            "/translate/stream",
+            json={"schema": SCHEMA, "question": "Наименования товаров"},
+        ) as response:
+            assert response.status_code == 200
+            events = [json.loads(line) for line in response.iter_lines() if line]
+        assert "".join(e.get("content", "") for e in events[:-1]) == CONTENT
+        assert events[-1]["done"] is True
+        assert events[-1]["content"] == CONTENT
+        assert token_counts()[1] > generated_tokens
@@ -0,0 +1,48 @@
+import time
+
+import httpx
+import pytest
+
+from conftest import free_port
+from stub_ollama import ServerThread
+
+SCHEMA = "Справочник.Товары : Ссылка (Строка)"
+
+
+def wait_for(condition, timeout: float = 5) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.05)
+    return condition()
+
+
+@pytest.mark.parametrize(
+    "path, body",
+    [
+        ("/translate", {"schema": SCHEMA, "question": "q"}),
+        ("/translate/batch", {"schema": SCHEMA, "questions": ["q1", "q2"]}),
+    ],
+)
+def test_client_timeout_cancels_generation(
+    load_api, start_stub, stub_port, path, body
+):
+    stub = start_stub(delay=2.0)
+    main = load_api()
+    # Отключение клиента видно только через настоящий сервер
+    port = free_port()
+    api = ServerThread(main.app, port)
+    api.start()
+    try:
+        with pytest.raises(httpx.TimeoutException):
+            httpx.post(f"http://127.0.0.1:{port}{path}", json=body, timeout=0.3)
+        # Генерация на сервере модели прервана, а не доработала до конца
+        assert wait_for(lambda: stub.state.aborted >= 1)
+        state = main.app.state
+        assert wait_for(lambda: state.admission.in_flight == 0)
+        assert all(b.outstanding == 0 for b in state.backends.backends)
+        stats = httpx.get(f"http://127.0.0.1:{stub_port}/stub/stats")
+        assert stats.json()["aborted"] == stub.state.aborted
+    finally:
+        api.stop()
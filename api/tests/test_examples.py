@@ -0,0 +1,34 @@
+import json
+
+from cache import schema_hash
+from examples import ExampleStore
+
+SCHEMA = "Справочник.Товары : Ссылка (Строка), Наименование (Строка)"
+
+
+def write_pairs(path, pairs):
+    with open(path, "w", encoding="utf-8") as file:
+        for question, query in pairs:
+            messages = [
+                {"role": "system", "content": f"SCHEMA: {SCHEMA}"},
+                {"role": "user", "content": question},
+                {"role": "assistant", "content": query},
+            ]
+            file.write(json.dumps({"messages": messages}, ensure_ascii=False) + "\n")
+
+
+def test_seeded_files_do_not_evict_examples(tmp_path):
+    first = [("Все товары", "ВЫБРАТЬ Ссылка ИЗ Справочник.Товары")]
+    second = [
+        ("Наименования товаров", "ВЫБРАТЬ Наименование ИЗ Справочник.Товары"),
+        ("Количество товаров", "ВЫБРАТЬ КОЛИЧЕСТВО(*) ИЗ Справочник.Товары"),
+    ]
+    write_pairs(tmp_path / "first.json", first)
+    write_pairs(tmp_path / "second.json", second)
+    store = ExampleStore()
+    store.seed(str(tmp_path / "first.json"))
+    store.seed(str(tmp_path / "second.json"))
+
+    assert len(store) == 3
+    examples = store.select(schema_hash(SCHEMA), "Все товары", k=3)
+    assert sorted(examples) == sorted(first + second)
@@ -0,0 +1,89 @@
+import json
+import time
+
+from fastapi.testclient import TestClient
+
+SCHEMA = "Справочник.Товары : Ссылка (Строка)"
+RECORDS = [{"schema": SCHEMA, "question": f"q{i}"} for i in range(10)]
+
+
+def wait_completed(client, job_id: str, timeout: float = 10) -> dict:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        status = client.get(f"/jobs/{job_id}").json()
+        if status["status"] == "completed":
+            return status
+        time.sleep(0.05)
+    return status
+
+
+def upload(client, lines: list) -> str:
+    body = "\n".join(lines) + "\n"
+    return client.post("/jobs", content=body.encode()).json()["job_id"]
+
+
+def test_job_waits_out_model_outage(load_api, start_stub):
+    main = load_api(
+        BREAKER_RESET_TIMEOUT=0.2,
+        RETRY_MAX_ATTEMPTS=1,
+        JOBS_RETRY_BASE=0.05,
+        JOBS_RETRY_MAX=0.2,
+    )
+    lines = [json.dumps(r, ensure_ascii=False) for r in RECORDS]
+    lines += [json.dumps({"schema_id": "unknown", "question": "q"}), "not json"]
+    with TestClient(main.app) as client:
+        job_id = upload(client, lines)
+        # Сервер модели недоступен: временные ошибки не попадают в результаты
+        time.sleep(1)
+        status = client.get(f"/jobs/{job_id}").json()
+        assert status["status"] == "running"
+        assert status["failed"] <= 2
+        start_stub(delay=0.01)
+        status = wait_completed(client, job_id)
+        lines = client.get(f"/jobs/{job_id}/results").text.splitlines()
+    results = [json.loads(line) for line in lines]
+    assert status["completed"] == len(RECORDS) + 2
+    assert status["failed"] == 2
+    errors = sorted(r["index"] for r in results if "error" in r)
+    assert errors == [len(RECORDS), len(RECORDS) + 1]
+
+
+def test_resume_drops_partial_line(load_api, start_stub, tmp_path):
+    start_stub(delay=0.01)
+    main = load_api()
+    lines = [json.dumps(r, ensure_ascii=False) for r in RECORDS]
+    with TestClient(main.app) as client:
+        job_id = upload(client, lines)
+        wait_completed(client, job_id)
+
+    # Аварийная остановка: последняя строка оборвана, задание не завершено
+    job_dir = tmp_path / "jobs" / job_id
+    results = (job_dir / "results.jsonl").read_text(encoding="utf-8").splitlines(True)
+    (job_dir / "results.jsonl").write_text(
+        "".join(results[:5]) + results[5][:10], encoding="utf-8"
+    )
+    state = json.loads((job_dir / "state.json").read_text())
+    state["status"] = "running"
+    (job_dir / "state.json").write_text(json.dumps(state))
+
+    main = load_api()
+    with TestClient(main.app) as client:
+        status = wait_completed(client, job_id)
+        lines = client.get(f"/jobs/{job_id}/results").text.splitlines()
+    assert status["completed"] == len(RECORDS)
+    indices = sorted(json.loads(line)["index"] for line in lines)
+    assert indices == list(range(len(RECORDS)))
+
+
+def test_blank_lines_are_not_records(load_api, start_stub):
+    start_stub(delay=0.01)
+    main = load_api()
+    record = json.dumps(RECORDS[0], ensure_ascii=False)
+    with TestClient(main.app) as client:
+        job_id = upload(client, [record, "", record, "  ", ""])
+        status = wait_completed(client, job_id)
+        lines = client.get(f"/jobs/{job_id}/results").text.splitlines()
+    assert status["total"] == 2
+    assert status["completed"] == 2
+    assert status["failed"] == 0
+    assert sorted(json.loads(line)["index"] for line in lines) == [0, 2]
@@ -0,0 +1,76 @@
+import random
+
+import pytest
+
+from similar_cache import SimilarQuestionIndex
+
+QUESTION = "Покажите названия магазинов, которые продают товары дешевле 100 рублей"
+QUERY = "ВЫБРАТЬ Магазины.Название ИЗ Магазины"
+
+
+@pytest.fixture
+def index() -> SimilarQuestionIndex:
+    index = SimilarQuestionIndex(max_entries=10)
+    index.add(QUESTION, QUERY)
+    return index
+
+
+@pytest.mark.parametrize(
+    "question",
+    [
+        "покажите названия магазинов которые продают товары дешевле 100 рублей?",
+        "Названия магазинов покажите, которые продают товары дешевле 100 рублей",
+        # Опечатка
+        "Покажите названия магзинов, которые продают товары дешевле 100 рублей",
+    ],
+)
+def test_similar_question_hits(index, question):
+    found = index.lookup(question, threshold=0.9)
+    assert found is not None and found[0] == QUERY
+
+
+@pytest.mark.parametrize(
+    "question",
+    [
+        # Отрицание
+        "Покажите названия магазинов, которые не продают товары дешевле 100 рублей",
+        # Слова поменялись ролями
+        "Покажите названия товаров, которые продают магазины дешевле 100 рублей",
+        # Другое служебное слово
+        "Покажите названия магазинов, которые продают товары, кроме дешевле "
+        "100 рублей",
+        # Другой литерал
+        "Покажите названия магазинов, которые продают товары дешевле 200 рублей",
+    ],
+)
+def test_similar_question_misses(index, question):
+    assert index.lookup(question, threshold=0.9) is None
+
+
+class CountingPostings(dict):
+    """Список вхождений, считающий просмотренные элементы."""
+
+    scanned = 0
+
+    def items(self):
+        for item in super().items():
+            CountingPostings.scanned += 1
+            yield item
+
+
+def test_lookup_work_is_bounded():
+    rng = random.Random(0)
+    letters = "абвгдежзиклмнопрстуфхцчшэюя"
+    index = SimilarQuestionIndex(max_entries=10000)
+    # Все вопросы содержат одни и те же частые слова
+    for i in range(10000):
+        name = "".join(rng.choice(letters) for _ in range(8))
+        index.add(f"Покажите названия товаров магазина {name}", f"q{i}")
+    index._postings = {g: CountingPostings(p) for g, p in index._postings.items()}
+
+    CountingPostings.scanned = 0
+    found = index.lookup(f"названия товаров магазина {name}, покажите", 0.9)
+    assert found == (f"q{i}", pytest.approx(1.0))
+    assert CountingPostings.scanned <= index.max_postings
+    scores = index.similarities("Покажите названия товаров магазина")
+    assert 0 < len(scores) <= index.max_candidates
@@ -0,0 +1,23 @@
+import pytest
+
+from warmup import keep_alive_seconds, parse_keep_alive
+
+
+@pytest.mark.parametrize(
+    "value, expected",
+    [("30m", "30m"), ("1h30m", "1h30m"), ("300", 300), ("1.5", 1.5), ("-1", -1)],
+)
+def test_parse_keep_alive(value, expected):
+    parsed = parse_keep_alive(value)
+    assert parsed == expected and type(parsed) is type(expected)
+
+
+@pytest.mark.parametrize("value", ["", "5 min", "1.5.0", "m"])
+def test_parse_keep_alive_rejects_invalid(value):
+    with pytest.raises(ValueError):
+        parse_keep_alive(value)
+
+
+def test_zero_keep_alive_unloads_immediately():
+    assert keep_alive_seconds(parse_keep_alive("0")) == 0
+    assert keep_alive_seconds(parse_keep_alive("-1")) is None
@@ -0,0 +1,107 @@
+import asyncio
+import logging
+import re
+from typing import Optional
+
+import httpx
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+# Единицы длительностей Go, в которых Ollama принимает keep_alive ("30m", "1h30m")
+DURATION_UNITS = {
+    "ns": 1e-9,
+    "us": 1e-6,
+    "µs": 1e-6,
+    "ms": 1e-3,
+    "s": 1,
+    "m": 60,
+    "h": 3600,
+}
+DURATION_PART = re.compile(r"(\d+(?:\.\d+)?)(ns|us|µs|ms|s|m|h)")
+NUMBER = re.compile(r"[+-]?\d+(?:\.\d+)?")
+
+
+def keep_alive_seconds(keep_alive) -> Optional[float]:
+    """
+    Переводит keep_alive Ollama (число секунд или длительность Go) в секунды.
+    Отрицательное значение - модель не выгружается, возвращается None.
+    """
+    if isinstance(keep_alive, (int, float)) or NUMBER.fullmatch(keep_alive.strip()):
+        seconds = float(keep_alive)
+    else:
+        text = keep_alive.strip()
+        sign = -1 if text.startswith("-") else 1
+        text = text.lstrip("+-")
+        parts = DURATION_PART.findall(text)
+        if not parts or "".join(n + u for n, u in parts) != text:
+            raise ValueError(f"Invalid keep_alive duration: {keep_alive!r}")
+        seconds = sign * sum(float(n) * DURATION_UNITS[u] for n, u in parts)
+    return None if seconds < 0 else seconds
+
+
+def parse_keep_alive(value: str):
+    """
+    Значение keep_alive для запросов к Ollama: число секунд передаётся
+    числом (строку без единицы измерения Ollama отвергает с ошибкой 400),
+    длительность - строкой. Неверное значение - ValueError.
+    """
+    value = value.strip()
+    keep_alive_seconds(value)
+    if NUMBER.fullmatch(value):
+        number = float(value)
+        return int(number) if number.is_integer() else number
+    return value
+
+
+async def warm_up(protocol, backend, model: str, keep_alive, timeout: float) -> bool:
+    """
+    Загружает модель в память сервера способом, который поддерживает его API.
+    """
+    try:
+        await protocol.warm_up(backend.client, model, keep_alive, timeout)
+    except httpx.HTTPError as e:
+        metrics.WARMUPS.labels(backend.url, "error").inc()
+        logger.warning("Warm-up of %s on %s failed: %s", model, backend.url, e)
+        return False
+    metrics.WARMUPS.labels(backend.url, "ok").inc()
+    return True
+
+
+async def keep_warm(
+    app,
+    protocol,
+    pools: list,
+    model: str,
+    keep_alive,
+    interval: float,
+    timeout: float,
+):
+    """
+    Прогревает модель на всех серверах при старте и затем повторяет прогрев
+    каждые interval секунд, чтобы Ollama не выгрузила простаивающую модель.
+    Пока прогрев ни на одном сервере не удался, app.state.warmed_up = False.
+
+    При keep_alive=0 Ollama выгружает модель сразу после каждого запроса:
+    повторять прогрев бесполезно, он выполняется до первого успешного.
+    """
+    backends = [b for pool in pools for b in pool.backends]
+    unload_immediately = keep_alive_seconds(keep_alive) == 0
+    if unload_immediately:
+        logger.warning(
+            "keep_alive=0: %s is unloaded after every request, "
+            "periodic warm-up is disabled",
+            model,
+        )
+    while True:
+        results = await asyncio.gather(
+            *(warm_up(protocol, b, model, keep_alive, timeout) for b in backends)
+        )
+        if any(results) and not app.state.warmed_up:
+            app.state.warmed_up = True
+            logger.info("Model %s is warmed up", model)
+        if unload_immediately and app.state.warmed_up:
+            return
+        # Пока модель не загружена ни на одном сервере, повторяем чаще
+        await asyncio.sleep(interval if app.state.warmed_up else min(interval, 5))
@@ -0,0 +1,184 @@
+import argparse
+import csv
+import json
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from evaluate_model import COMPONENTS, component_matching_f1
+
+# Колонки оценок: полное совпадение и F1 компонент (как в compare.ipynb)
+COLUMNS = ["exact"] + [comp.lower() for comp in COMPONENTS]
+
+
+def read_csv_chunks(path: str, pred_column: str, ref_column: str, chunk_size: int):
+    # Файлы results/*.csv: разделитель ";", первая колонка - индекс
+    with open(path, encoding="utf-8-sig", newline="") as file:
+        reader = csv.reader(file, delimiter=";")
+        header = next(reader)
+        pred_index, ref_index = header.index(pred_column), header.index(ref_column)
+        chunk = []
+        for row in reader:
+            chunk.append((row[pred_index], row[ref_index]))
+            if len(chunk) == chunk_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+
+def read_jsonl_chunks(path: str, pred_column: str, ref_column: str, chunk_size: int):
+    with open(path, encoding="utf-8") as file:
+        chunk = []
+        for line in file:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            chunk.append((record.get(pred_column) or "", record.get(ref_column) or ""))
+            if len(chunk) == chunk_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+
+def read_parquet_chunks(path: str, pred_column: str, ref_column: str, chunk_size: int):
+    # pyarrow нужен только для Parquet
+    import pyarrow.parquet as pq
+
+    parquet = pq.ParquetFile(path)
+    for batch in parquet.iter_batches(
+        batch_size=chunk_size, columns=[pred_column, ref_column]
+    ):
+        preds = batch.column(pred_column).to_pylist()
+        refs = batch.column(ref_column).to_pylist()
+        yield [(p or "", r or "") for p, r in zip(preds, refs)]
+
+
+def read_pairs(
+    path: str,
+    pred_column: str = "pred",
+    ref_column: str = "ref",
+    chunk_size: int = 5000,
+):
+    """
+    Читает пары (предсказанный запрос, эталонный запрос) частями
+    по chunk_size строк; формат определяется по расширению файла
+    (.csv, .jsonl/.json, .parquet).
+    """
+    extension = os.path.splitext(path)[1].lower()
+    if extension == ".csv":
+        reader = read_csv_chunks
+    elif extension in (".jsonl", ".json"):
+        reader = read_jsonl_chunks
+    elif extension == ".parquet":
+        reader = read_parquet_chunks
+    else:
+        raise ValueError(f"Неподдерживаемый формат файла: {path}")
+    return reader(path, pred_column, ref_column, chunk_size)
+
+
+def score_chunk(chunk: list) -> np.ndarray:
+    """
+    Оценки части пар: массив (строки x COLUMNS).
+    """
+    scores = np.empty((len(chunk), len(COLUMNS)), dtype=np.float64)
+    for i, (pred, ref) in enumerate(chunk):
+        f1 = component_matching_f1(pred, ref)
+        scores[i, 0] = pred.lower() == ref.lower()
+        for j, comp in enumerate(COMPONENTS, start=1):
+            scores[i, j] = f1[comp]
+    return scores
+
+
+def iter_scores(chunks, processes: int = None):
+    """
+    Оценивает части пар в пуле процессов и возвращает массивы оценок
+    в порядке частей. Одновременно в работе не больше двух частей
+    на процесс, поэтому память не зависит от размера файла.
+    """
+    processes = processes or os.cpu_count() or 1
+    if processes == 1:
+        for chunk in chunks:
+            yield score_chunk(chunk)
+        return
+    with ProcessPoolExecutor(processes) as executor:
+        pending = deque()
+        for chunk in chunks:
+            pending.append(executor.submit(score_chunk, chunk))
+            if len(pending) >= 2 * processes:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def score_file(
+    path: str,
+    pred_column: str = "pred",
+    ref_column: str = "ref",
+    chunk_size: int = 5000,
+    processes: int = None,
+    keep_rows: bool = True,
+) -> tuple:
+    """
+    Оценивает все пары файла. Оценки по строкам занимают 7 чисел на строку;
+    при keep_rows=False память не зависит от размера файла.
+
+    :return: (оценки по строкам - словарь колонка -> массив NumPy или None
+        при keep_rows=False, средние значения по колонкам)
+    """
+    chunks = read_pairs(path, pred_column, ref_column, chunk_size)
+    totals = np.zeros(len(COLUMNS), dtype=np.float64)
+    count = 0
+    parts = []
+    for scores in iter_scores(chunks, processes):
+        totals += scores.sum(axis=0, dtype=np.float64)
+        count += len(scores)
+        if keep_rows:
+            parts.append(scores)
+    averages = {
+        column: round(float(total / count), 4) if count else 0.0
+        for column, total in zip(COLUMNS, totals)
+    }
+    if not keep_rows:
+        return None, averages
+    rows = np.concatenate(parts) if parts else np.empty((0, len(COLUMNS)))
+    return {column: rows[:, j] for j, column in enumerate(COLUMNS)}, averages
+
+
+def run():
+    parser = argparse.ArgumentParser(
+        description="Потоковая оценка Exact match и Component match в пуле процессов"
+    )
+    parser.add_argument("path", help="файл CSV (results/*.csv), JSONL или Parquet")
+    parser.add_argument("--pred-column", default="pred")
+    parser.add_argument("--ref-column", default="ref")
+    parser.add_argument("--chunk-size", type=int, default=5000)
+    parser.add_argument(
+        "--processes", type=int, help="число процессов (по умолчанию - все ядра)"
+    )
+    parser.add_argument("--output", help="файл .npz с оценками по строкам")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    rows, averages = score_file(
+        args.path,
+        args.pred_column,
+        args.ref_column,
+        args.chunk_size,
+        args.processes,
+        keep_rows=args.output is not None,
+    )
+    elapsed = time.perf_counter() - start
+    for column, value in averages.items():
+        print(f"{column}: {value:.4f}")
+    print(f"Время: {elapsed:.1f} с")
+    if args.output:
+        np.savez_compressed(args.output, **rows)
+
+
+if __name__ == "__main__":
+    run()
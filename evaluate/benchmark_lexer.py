@@ -0,0 +1,136 @@
+import argparse
+import json
+import re
+import time
+
+from evaluate_model import (
+    COMPONENTS,
+    KEYWORD_MAP,
+    LOGICAL_MAP,
+    component_matching_f1,
+    normalize_query,
+    parse_query_components,
+    reference_token_sets,
+)
+
+# Прежняя реализация метрики (замены подстрок и регулярные выражения
+# на каждый запрос) - для сравнения скорости здесь и значений в тестах
+
+
+def legacy_normalize_query(query: str) -> str:
+    text = query.strip()
+    text = re.sub(r"([\(\),])", r" \1 ", text)
+    text = text.upper()
+    for rus, eng in sorted(KEYWORD_MAP.items(), key=lambda x: -len(x[0])):
+        text = text.replace(rus, eng)
+    for syn, std in LOGICAL_MAP.items():
+        text = re.sub(rf"\b{syn}\b", std, text)
+    text = re.sub(r"\s+", " ", text)
+    return text.strip()
+
+
+def legacy_parse_query_components(query: str) -> dict:
+    normalized = legacy_normalize_query(query)
+    components = {comp: "" for comp in COMPONENTS}
+    indices = {}
+    for key in components.keys():
+        match = re.search(rf"\b{key}\b", normalized)
+        if match:
+            indices[key] = match.start()
+    if "SELECT" not in indices:
+        return components
+    present_sections = sorted(indices.items(), key=lambda x: x[1])
+    present_sections.append(("END", len(normalized)))
+    for i in range(len(present_sections) - 1):
+        sec_name, start_idx = present_sections[i]
+        _, next_start = present_sections[i + 1]
+        components[sec_name] = normalized[
+            start_idx + len(sec_name) : next_start
+        ].strip()
+    return components
+
+
+def legacy_component_matching_f1(pred_query: str, ref_query: str) -> dict:
+    pred_comp = legacy_parse_query_components(pred_query)
+    ref_comp = legacy_parse_query_components(ref_query)
+    scores = {}
+    for comp in COMPONENTS:
+        pred_tokens = set(t for t in pred_comp[comp].split() if t != ",")
+        ref_tokens = set(t for t in ref_comp[comp].split() if t != ",")
+        if len(ref_tokens) == 0 and len(pred_tokens) == 0:
+            f1 = 1.0
+        elif len(ref_tokens) == 0 or len(pred_tokens) == 0:
+            f1 = 0.0
+        else:
+            true_positives = len(pred_tokens & ref_tokens)
+            precision = true_positives / len(pred_tokens)
+            recall = true_positives / len(ref_tokens)
+            f1 = (
+                0.0
+                if (precision + recall) == 0
+                else 2 * precision * recall / (precision + recall)
+            )
+        scores[comp] = round(f1, 4)
+    return scores
+
+
+def load_references(path: str) -> list:
+    with open(path, encoding="utf-8") as file:
+        return [json.loads(line)["messages"][2]["content"] for line in file]
+
+
+def measure(function, queries: list, repeat: int) -> float:
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function(queries)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def run():
+    parser = argparse.ArgumentParser(
+        description=(
+            "Сравнение скорости Component matching прежней и новой (лексер) "
+            "реализаций; совпадение значений проверяют тесты tests/test_query_lexer.py"
+        )
+    )
+    parser.add_argument("--test", default="../dataset/data/ru_test.json")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    references = load_references(args.test)
+    print(f"Запросов: {len(references)}, лучшее из {args.repeat} прогонов")
+    benchmarks = [
+        ("normalize", normalize_query, legacy_normalize_query),
+        ("parse", parse_query_components, legacy_parse_query_components),
+        (
+            "f1",
+            lambda q: component_matching_f1(q, q),
+            lambda q: legacy_component_matching_f1(q, q),
+        ),
+    ]
+    for name, new, legacy in benchmarks:
+        # Эталоны разбираются заново в каждом прогоне
+        new_time = measure(
+            lambda qs: reference_token_sets.cache_clear() or [new(q) for q in qs],
+            references,
+            args.repeat,
+        )
+        old_time = measure(
+            lambda qs: [legacy(q) for q in qs], references, args.repeat
+        )
+        print(
+            f"{name:10} прежняя {old_time:.4f} с, новая {new_time:.4f} с, "
+            f"ускорение {old_time / new_time:.1f}x"
+        )
+    # Следующая модель на той же тестовой выборке: эталоны уже разобраны
+    cached_time = measure(
+        lambda qs: [component_matching_f1(q, q) for q in qs], references, args.repeat
+    )
+    print(f"{'f1 (кэш)':10} новая {cached_time:.4f} с")
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,218 @@
+import argparse
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from statistics import NormalDist
+
+import numpy as np
+
+ConfidenceInterval = namedtuple("ConfidenceInterval", ["point", "lower", "upper"])
+
+# Ограничение размера матрицы индексов одной части бутстрэпа (элементов)
+MAX_CHUNK_ELEMENTS = 1 << 22
+
+_NORMAL = NormalDist()
+
+
+def _chunk_means(scores: np.ndarray, seed, size: int) -> np.ndarray:
+    """
+    Средние по size бутстрэп-выборкам: матрица индексов (size x n)
+    переводится в число повторов каждой строки, средние - одним
+    матричным умножением на матрицу оценок.
+    """
+    n = len(scores)
+    rng = np.random.default_rng(seed)
+    indices = rng.integers(0, n, size=(size, n))
+    indices += np.arange(size)[:, None] * n
+    counts = np.bincount(indices.ravel(), minlength=size * n).reshape(size, n)
+    return counts @ scores / n
+
+
+def bootstrap_means(
+    scores: np.ndarray,
+    n_bootstrap: int = 1000,
+    seed: int = None,
+    processes: int = None,
+    max_chunk_elements: int = MAX_CHUNK_ELEMENTS,
+) -> np.ndarray:
+    """
+    Средние значения метрик по бутстрэп-выборкам строк.
+
+    :param scores: матрица оценок (строки x метрики)
+    :return: матрица (n_bootstrap x метрики)
+
+    Итерации делятся на части не больше max_chunk_elements индексов; у каждой
+    части своё зерно, порождённое от seed, поэтому результат при заданном seed
+    не зависит от числа процессов.
+    """
+    scores = np.asarray(scores, dtype=np.float64)
+    if scores.ndim == 1:
+        scores = scores[:, None]
+    chunk = max(1, min(n_bootstrap, max_chunk_elements // max(len(scores), 1)))
+    sizes = [min(chunk, n_bootstrap - i) for i in range(0, n_bootstrap, chunk)]
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    if processes and processes > 1 and len(sizes) > 1:
+        with ProcessPoolExecutor(processes) as executor:
+            parts = list(
+                executor.map(_chunk_means, [scores] * len(sizes), seeds, sizes)
+            )
+    else:
+        parts = [_chunk_means(scores, s, size) for s, size in zip(seeds, sizes)]
+    return np.concatenate(parts)
+
+
+def percentile_intervals(boot: np.ndarray, alpha: float = 0.05) -> tuple:
+    """
+    Перцентильные границы по бутстрэп-средним (n_bootstrap x метрики).
+    """
+    lower, upper = np.quantile(boot, [alpha / 2, 1 - alpha / 2], axis=0)
+    return lower, upper
+
+
+def bca_intervals(scores: np.ndarray, boot: np.ndarray, alpha: float = 0.05) -> tuple:
+    """
+    Границы BCa (с поправкой на смещение и асимметрию) для среднего.
+
+    Ускорение оценивается методом складного ножа: средние без одной строки
+    для среднего вычисляются сразу для всех строк. Для метрик с вырожденным
+    распределением (все бутстрэп-средние по одну сторону от точечной
+    оценки) используются перцентильные границы.
+    """
+    scores = np.asarray(scores, dtype=np.float64)
+    if scores.ndim == 1:
+        scores = scores[:, None]
+    n = len(scores)
+    point = scores.mean(axis=0)
+    lower, upper = percentile_intervals(boot, alpha)
+    # Средние без i-й строки и их отклонения от среднего по складному ножу
+    jackknife = (scores.sum(axis=0) - scores) / max(n - 1, 1)
+    deviations = jackknife.mean(axis=0) - jackknife
+    numerator = (deviations**3).sum(axis=0)
+    denominator = 6 * (deviations**2).sum(axis=0) ** 1.5
+    z_alpha = np.array([_NORMAL.inv_cdf(alpha / 2), _NORMAL.inv_cdf(1 - alpha / 2)])
+    for j in range(scores.shape[1]):
+        below = np.mean(boot[:, j] < point[j])
+        if not 0 < below < 1:
+            continue
+        z0 = _NORMAL.inv_cdf(below)
+        a = numerator[j] / denominator[j] if denominator[j] > 0 else 0.0
+        z = z0 + (z0 + z_alpha) / (1 - a * (z0 + z_alpha))
+        levels = [_NORMAL.cdf(value) for value in z]
+        lower[j], upper[j] = np.quantile(boot[:, j], levels)
+    return lower, upper
+
+
+def wilson_intervals(count, nobs, alpha: float = 0.05) -> tuple:
+    """
+    Интервал Вильсона для доли (как proportion_confint(method="wilson")
+    из statsmodels); count и nobs могут быть массивами.
+    """
+    count = np.asarray(count, dtype=np.float64)
+    nobs = np.asarray(nobs, dtype=np.float64)
+    z = _NORMAL.inv_cdf(1 - alpha / 2)
+    p = count / nobs
+    denominator = 1 + z**2 / nobs
+    center = (p + z**2 / (2 * nobs)) / denominator
+    half = z * np.sqrt(p * (1 - p) / nobs + z**2 / (4 * nobs**2)) / denominator
+    return center - half, center + half
+
+
+def confidence_intervals(
+    scores,
+    names: list = None,
+    method="bca",
+    alpha: float = 0.05,
+    n_bootstrap: int = 1000,
+    seed: int = None,
+    processes: int = None,
+) -> dict:
+    """
+    Точечные и интервальные оценки средних всех метрик.
+
+    :param scores: матрица оценок (строки x метрики), например оценки
+        batch_scorer.score_file, или словарь имя метрики -> массив по строкам
+    :param method: "bca", "percentile" или "wilson" (для метрик 0/1 - Exact
+        match, Execution accuracy); словарь имя метрики -> метод задаёт
+        метод каждой метрике, по умолчанию - "bca"
+    :return: словарь имя метрики -> ConfidenceInterval(point, lower, upper)
+    """
+    if isinstance(scores, dict):
+        names = names or list(scores)
+        scores = np.column_stack([scores[name] for name in names])
+    scores = np.asarray(scores, dtype=np.float64)
+    if scores.ndim == 1:
+        scores = scores[:, None]
+    names = names or [f"metric_{j}" for j in range(scores.shape[1])]
+    methods = [
+        method.get(name, "bca") if isinstance(method, dict) else method
+        for name in names
+    ]
+    unknown = set(methods) - {"bca", "percentile", "wilson"}
+    if unknown:
+        raise ValueError(f"Неизвестный метод интервальной оценки: {unknown}")
+    point = scores.mean(axis=0)
+    lower, upper = np.empty_like(point), np.empty_like(point)
+
+    # Бутстрэп - одним проходом для всех метрик, которым он нужен
+    resampled = [j for j, m in enumerate(methods) if m in ("bca", "percentile")]
+    if resampled:
+        boot = bootstrap_means(scores[:, resampled], n_bootstrap, seed, processes)
+        bounds = {
+            "percentile": percentile_intervals(boot, alpha),
+            "bca": bca_intervals(scores[:, resampled], boot, alpha),
+        }
+        for k, j in enumerate(resampled):
+            lower[j] = bounds[methods[j]][0][k]
+            upper[j] = bounds[methods[j]][1][k]
+    wilson = [j for j, m in enumerate(methods) if m == "wilson"]
+    if wilson:
+        count = scores[:, wilson].sum(axis=0)
+        lower[wilson], upper[wilson] = wilson_intervals(count, len(scores), alpha)
+    return {
+        name: ConfidenceInterval(float(point[j]), float(lower[j]), float(upper[j]))
+        for j, name in enumerate(names)
+    }
+
+
+def run():
+    parser = argparse.ArgumentParser(
+        description=(
+            "Доверительные интервалы метрик по оценкам строк "
+            "(файл .npz из batch_scorer.py)"
+        )
+    )
+    parser.add_argument("path", help="файл .npz с оценками по строкам")
+    parser.add_argument("--method", choices=["bca", "percentile"], default="bca")
+    parser.add_argument(
+        "--wilson",
+        nargs="*",
+        default=["exact", "executed"],
+        help="метрики 0/1 с интервалом Вильсона",
+    )
+    parser.add_argument("--alpha", type=float, default=0.05)
+    parser.add_argument("--n-bootstrap", type=int, default=1000)
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("--processes", type=int)
+    args = parser.parse_args()
+
+    with np.load(args.path) as data:
+        scores = {name: data[name] for name in data.files}
+    method = {name: args.method for name in scores}
+    method.update({name: "wilson" for name in args.wilson if name in scores})
+    intervals = confidence_intervals(
+        scores,
+        method=method,
+        alpha=args.alpha,
+        n_bootstrap=args.n_bootstrap,
+        seed=args.seed,
+        processes=args.processes,
+    )
+    level = round((1 - args.alpha) * 100)
+    for name, ci in intervals.items():
+        print(
+            f"{name}: {ci.point:.4f}, {level}% CI ({method[name]}) = "
+            f"[{ci.lower:.4f}, {ci.upper:.4f}]"
+        )
+
+
+if __name__ == "__main__":
+    run()
@@ -1,4 +1,8 @@
 import re
+from functools import lru_cache
+
+from query_ast import clause_tokens, iter_blocks, parse_tokens
+from query_lexer import KEYWORD, STRING, QueryLexer
 
 # Словари синонимов и соответствий языков
 KEYWORD_MAP = {
@@ -23,108 +27,122 @@ LOGICAL_MAP = {
 }
 
 
+COMPONENTS = ["SELECT", "FROM", "WHERE", "GROUP BY", "HAVING", "ORDER BY"]
+
+# Части строкового литерала для F1: слова, скобки и запятые
+STRING_WORDS = re.compile(r"[(),]|[^\s(),]+")
+
+LEXER = QueryLexer(KEYWORD_MAP, LOGICAL_MAP)
+
+
+def query_tokens(query: str) -> list:
+    """Разбивает запрос на нормализованные лексемы (см. query_lexer.QueryLexer)."""
+    return LEXER.tokenize(query)
+
+
 def normalize_query(query: str) -> str:
     """Приводит запрос к упрощенному каноническому виду:
     убрать лишние пробелы, заменить синонимы, привести к верхнему регистру."""
-    # Убираем начальные/конечные пробелы и лишние пробелы внутри
-    text = query.strip()
-    # Заменяем запятые и скобки пробелами вокруг, чтобы они учитывались
-    # как отдельные токены при split, если нужно
-    text = re.sub(r"([\(\),])", r" \1 ", text)
-    # Приводим к верхнему регистру
-    text = text.upper()
-    # Заменяем ключевые слова (более длинные сначала, чтобы не перепутать часть фразы)
-    # Например, "СГРУППИРОВАТЬ ПО" должен замениться целиком, 
-    # а не по отдельности "СГРУППИРОВАТЬ" или "ПО".
-    for rus, eng in sorted(KEYWORD_MAP.items(), key=lambda x: -len(x[0])):
-        text = text.replace(rus, eng)
-    # Заменяем логические операторы/константы
-    for syn, std in LOGICAL_MAP.items():
-        # добавляем пробелы вокруг, чтобы заменить только как отдельные слова
-        text = re.sub(rf"\b{syn}\b", std, text)
-    # Убираем повторные пробелы
-    text = re.sub(r"\s+", " ", text)
-    return text.strip()
+    return " ".join(token.text for token in query_tokens(query))
 
 
-def parse_query_components(query: str) -> dict:
-    """Разбивает запрос 1С на компоненты. Предполагается один SELECT без вложенных запросов."""
-    normalized = normalize_query(query)
-    components = {
-        "SELECT": "",
-        "FROM": "",
-        "WHERE": "",
-        "GROUP BY": "",
-        "HAVING": "",
-        "ORDER BY": "",
-    }
-    # Найдём позиции ключевых секций в строке
-    # Для надёжности ищем с пробелом или концом строки,
-    # чтобы не перепутать, например, "WHERE" внутри имени поля.
+def split_components(tokens: list) -> dict:
+    """Делит поток лексем на компоненты по первому вхождению ключевого слова
+    каждой секции. Предполагается один SELECT без вложенных запросов."""
+    components = {comp: [] for comp in COMPONENTS}
+    # Позиции ключевых слов секций (как отдельных лексем, а не частей имён)
     indices = {}
-    for key in components.keys():
-        # Регекс для ключевого слова как отдельного (например, r'\bSELECT\b')
-        match = re.search(rf"\b{key}\b", normalized)
-        if match:
-            indices[key] = match.start()
+    for i, token in enumerate(tokens):
+        if (
+            token.text in components
+            and token.kind == KEYWORD
+            and token.text not in indices
+        ):
+            indices[token.text] = i
     if "SELECT" not in indices:
         # Если нет SELECT, возвращаем пустые компоненты
         return components
 
-    # Определяем порядок секций, которые присутствуют, по их стартовым индексам
+    # Секции в порядке появления; содержимое - лексемы до следующей секции
     present_sections = sorted(indices.items(), key=lambda x: x[1])
-    # Добавляем фиктивный конец строки как границу последней секции
-    present_sections.append(("END", len(normalized)))
-
-    # Выделяем текст между текущей секцией и началом следующей
-    for i in range(len(present_sections) - 1):
-        sec_name, start_idx = present_sections[i]
-        _, next_start = present_sections[i + 1]
-        if sec_name == "SELECT":
-            # Отрезаем "SELECT" + пробел, чтобы оставить только содержимое
-            comp_text = normalized[start_idx + len("SELECT") : next_start].strip()
-        else:
-            comp_text = normalized[start_idx + len(sec_name) : next_start].strip()
-        components[sec_name] = comp_text
-
+    present_sections.append(("END", len(tokens)))
+    for (sec_name, start_idx), (_, next_start) in zip(
+        present_sections, present_sections[1:]
+    ):
+        components[sec_name] = tokens[start_idx + 1 : next_start]
     return components
 
 
+def parse_query_components(query: str) -> dict:
+    """Разбивает запрос 1С на компоненты. Предполагается один SELECT без вложенных запросов
+    (объединения и подзапросы разбирает parse_query)."""
+    return {
+        comp: " ".join(token.text for token in comp_tokens)
+        for comp, comp_tokens in split_components(query_tokens(query)).items()
+    }
+
+
+def tokens_f1(pred_tokens: set, ref_tokens: set) -> float:
+    """F1-score для множеств лексем одной компоненты."""
+    if len(ref_tokens) == 0 and len(pred_tokens) == 0:
+        # Если ни в рефе, ни в предсказании компоненты нет, считаем идеальным (можно пропустить)
+        return 1.0
+    if len(ref_tokens) == 0 or len(pred_tokens) == 0:
+        # Лишняя компонента в предсказании или отсутствует обязательная
+        return 0.0
+    # Вычисляем Precision, Recall, F1
+    true_positives = len(pred_tokens & ref_tokens)
+    precision = true_positives / len(pred_tokens)
+    recall = true_positives / len(ref_tokens)
+    return (
+        0.0
+        if (precision + recall) == 0
+        else 2 * precision * recall / (precision + recall)
+    )
+
+
+def parse_query(query: str):
+    """Строит дерево запроса (query_ast.Query): объединения, подзапросы, соединения."""
+    return parse_tokens(query_tokens(query))
+
+
+def component_token_sets(query: str) -> dict:
+    """Множества лексем каждой компоненты по всем блокам запроса (без запятых).
+    Лексемы подзапроса относятся к компонентам подзапроса, а не внешнего блока.
+    Строковые литералы делятся на слова, как при прежнем разбиении по пробелам,
+    чтобы значения метрики оставались сопоставимы с уже посчитанными."""
+    sets = {comp: set() for comp in COMPONENTS}
+    for block in iter_blocks(parse_query(query)):
+        for comp, items in block.clauses:
+            words = sets[comp]
+            for token in clause_tokens(items):
+                if token.kind == STRING:
+                    words.update(
+                        w for w in STRING_WORDS.findall(token.text) if w != ","
+                    )
+                elif token.text != ",":
+                    words.add(token.text)
+    return sets
+
+
+@lru_cache(maxsize=65536)
+def reference_token_sets(query: str) -> dict:
+    """component_token_sets с запоминанием: эталонный запрос тестовой выборки
+    разбирается один раз при оценке любого числа моделей."""
+    return {
+        comp: frozenset(words) for comp, words in component_token_sets(query).items()
+    }
+
+
 def component_matching_f1(pred_query: str, ref_query: str) -> dict:
     """Рассчитывает F1-score для каждой компоненты между
     запросом модели и референсным запросом."""
-    pred_comp = parse_query_components(pred_query)
-    ref_comp = parse_query_components(ref_query)
-    scores = {}
-    for comp in ["SELECT", "FROM", "WHERE", "GROUP BY", "HAVING", "ORDER BY"]:
-        pred_text = pred_comp.get(comp, "")
-        ref_text = ref_comp.get(comp, "")
-        # Разбиваем на токены (простое разбиение по пробелам и запятым, которые уже окружены пробелами)
-        pred_tokens = set(
-            token for token in pred_text.split() if token not in {"", ","}
-        )
-        ref_tokens = set(token for token in ref_text.split() if token not in {"", ","})
-        if len(ref_tokens) == 0 and len(pred_tokens) == 0:
-            # Если ни в рефе, ни в предсказании компоненты нет, считаем идеальным (можно пропустить)
-            f1 = 1.0
-        elif len(ref_tokens) == 0:
-            # Если в эталоне компоненты нет, а в предсказании есть лишняя компонента
-            f1 = 0.0
-        elif len(pred_tokens) == 0:
-            # В предсказании отсутствует обязательная компонента
-            f1 = 0.0
-        else:
-            # Вычисляем Precision, Recall, F1
-            true_positives = len(pred_tokens & ref_tokens)
-            precision = true_positives / len(pred_tokens)
-            recall = true_positives / len(ref_tokens)
-            f1 = (
-                0.0
-                if (precision + recall) == 0
-                else 2 * precision * recall / (precision + recall)
-            )
-        scores[comp] = round(f1, 4)
-    return scores
+    pred_sets = component_token_sets(pred_query)
+    ref_sets = reference_token_sets(ref_query)
+    return {
+        comp: round(tokens_f1(pred_sets[comp], ref_sets[comp]), 4)
+        for comp in COMPONENTS
+    }
 
 
 def batch_component_matching_f1(predicted_queries, reference_queries):
@@ -143,7 +161,7 @@ def batch_component_matching_f1(predicted_queries, reference_queries):
         )
 
     # Инициализируем суммарные значения F1 для каждой компоненты
-    components = ["SELECT", "FROM", "WHERE", "GROUP BY", "HAVING", "ORDER BY"]
+    components = COMPONENTS
     cumulative_scores = {comp: 0.0 for comp in components}
 
     num_examples = len(predicted_queries)
@@ -0,0 +1,202 @@
+from collections import namedtuple
+
+from query_lexer import KEYWORD, PUNCT
+
+# Секции блока запроса в нормализованном виде (см. evaluate_model.KEYWORD_MAP)
+CLAUSES = ("SELECT", "FROM", "WHERE", "GROUP BY", "HAVING", "ORDER BY")
+
+UNION_WORDS = {"ОБЪЕДИНИТЬ", "UNION"}
+ALL_WORDS = {"ВСЕ", "ALL"}
+# Слова вида соединения; СОЕДИНЕНИЕ/JOIN завершают его
+JOIN_WORDS = {
+    "ВНУТРЕННЕЕ",
+    "ЛЕВОЕ",
+    "ПРАВОЕ",
+    "ПОЛНОЕ",
+    "ВНЕШНЕЕ",
+    "INNER",
+    "LEFT",
+    "RIGHT",
+    "FULL",
+    "OUTER",
+}
+JOIN_END_WORDS = {"СОЕДИНЕНИЕ", "JOIN"}
+ON_WORDS = {"ПО", "ON"}
+
+# Узлы дерева. Содержимое секций - кортежи лексем (query_lexer.Token)
+# и вложенных узлов: подзапрос - Query, соединение в секции FROM - Join.
+# Объединение блоков (ОБЪЕДИНИТЬ [ВСЕ])
+Query = namedtuple("Query", ["blocks"])
+# Блок ВЫБРАТЬ ...: кортеж пар (секция, содержимое) в порядке появления
+Block = namedtuple("Block", ["clauses"])
+# Соединение: вид ("ВНУТРЕННЕЕ", "СОЕДИНЕНИЕ"), источник и условие,
+# начинающееся с ключевого слова ПО
+Join = namedtuple("Join", ["kind", "source", "condition"])
+
+
+def _text(item):
+    # У узлов Query и Join текста нет
+    return getattr(item, "text", None)
+
+
+def _is_keyword(token, text: str) -> bool:
+    return token.kind == KEYWORD and token.text == text
+
+
+class _Parser:
+    """
+    Рекурсивный спуск по лексемам запроса; каждая лексема читается один раз.
+
+    Разбор не отвергает ошибочные запросы (ответы моделей): лексемы,
+    не образующие конструкций, остаются в содержимом текущей секции.
+    """
+
+    def __init__(self, tokens: list):
+        self.tokens = tokens
+        self.pos = 0
+
+    def parse(self) -> Query:
+        # Текст до первого ВЫБРАТЬ не относится к запросу
+        while self.pos < len(self.tokens):
+            if _is_keyword(self.tokens[self.pos], "SELECT"):
+                return self._query(nested=False)
+            self.pos += 1
+        return Query(())
+
+    def _peek(self):
+        return self.tokens[self.pos] if self.pos < len(self.tokens) else None
+
+    def _query(self, nested: bool) -> Query:
+        blocks = [self._block(nested)]
+        while True:
+            token = self._peek()
+            if token is None or token.text not in UNION_WORDS:
+                break
+            self.pos += 1
+            token = self._peek()
+            if token is not None and token.text in ALL_WORDS:
+                self.pos += 1
+                token = self._peek()
+            if token is None or not _is_keyword(token, "SELECT"):
+                break
+            blocks.append(self._block(nested))
+        return Query(tuple(blocks))
+
+    def _block(self, nested: bool) -> Block:
+        tokens = self.tokens
+        self.pos += 1  # SELECT
+        clauses = []
+        seen = {"SELECT"}
+        name, items = "SELECT", []
+        # Глубина скобок, не являющихся подзапросом
+        depth = 0
+        while self.pos < len(tokens):
+            token = tokens[self.pos]
+            kind = token.kind
+            if kind == KEYWORD and depth == 0:
+                if token.text in CLAUSES and token.text not in seen:
+                    clauses.append((name, self._clause(name, items)))
+                    seen.add(token.text)
+                    name, items = token.text, []
+                    self.pos += 1
+                    continue
+                if token.text in UNION_WORDS:
+                    break
+            elif kind == PUNCT:
+                if token.text == "(":
+                    following = tokens[self.pos + 1 : self.pos + 2]
+                    if following and _is_keyword(following[0], "SELECT"):
+                        self.pos += 1
+                        items.append(self._query(nested=True))
+                        closing = self._peek()
+                        if closing is not None and closing.text == ")":
+                            self.pos += 1
+                        continue
+                    depth += 1
+                elif token.text == ")":
+                    if depth == 0 and nested:
+                        break
+                    depth = max(depth - 1, 0)
+            items.append(token)
+            self.pos += 1
+        clauses.append((name, self._clause(name, items)))
+        return Block(tuple(clauses))
+
+    @staticmethod
+    def _clause(name: str, items: list) -> tuple:
+        if name != "FROM":
+            return tuple(items)
+        # FROM: первый источник, затем соединения
+        result = []
+        kind = None
+        source, condition = [], []
+        i = 0
+        while i < len(items):
+            text = _text(items[i])
+            if text in JOIN_WORDS or text in JOIN_END_WORDS:
+                if kind is not None:
+                    result.append(Join(kind, tuple(source), tuple(condition)))
+                # Вид соединения - до СОЕДИНЕНИЕ/JOIN включительно
+                start = i
+                while i < len(items) and _text(items[i]) in JOIN_WORDS:
+                    i += 1
+                if i < len(items) and _text(items[i]) in JOIN_END_WORDS:
+                    i += 1
+                kind = tuple(items[start:i])
+                source, condition = [], []
+                continue
+            if kind is None:
+                result.append(items[i])
+            elif condition or text in ON_WORDS:
+                condition.append(items[i])
+            else:
+                source.append(items[i])
+            i += 1
+        if kind is not None:
+            result.append(Join(kind, tuple(source), tuple(condition)))
+        return tuple(result)
+
+
+def parse_tokens(tokens: list) -> Query:
+    """
+    Строит дерево запроса по лексемам query_lexer.QueryLexer.
+
+    Поддерживается подмножество языка запросов 1С из dataset/convert_queries.py:
+    секции ВЫБРАТЬ ... УПОРЯДОЧИТЬ ПО, ОБЪЕДИНИТЬ [ВСЕ], подзапросы в скобках
+    (В (ВЫБРАТЬ ...), источники-подзапросы) и соединения ... СОЕДИНЕНИЕ ... ПО.
+    Время разбора линейно по числу лексем.
+    """
+    return _Parser(tokens).parse()
+
+
+def iter_blocks(query: Query):
+    """
+    Обходит все блоки запроса, включая объединения и подзапросы.
+    """
+    for block in query.blocks:
+        yield block
+        for _, items in block.clauses:
+            yield from _nested_blocks(items)
+
+
+def _nested_blocks(items: tuple):
+    for item in items:
+        if isinstance(item, Query):
+            yield from iter_blocks(item)
+        elif isinstance(item, Join):
+            yield from _nested_blocks(item.source)
+            yield from _nested_blocks(item.condition)
+
+
+def clause_tokens(items: tuple):
+    """
+    Лексемы содержимого секции без вложенных подзапросов
+    (их лексемы относятся к секциям своих блоков).
+    """
+    for item in items:
+        if isinstance(item, Join):
+            yield from item.kind
+            yield from clause_tokens(item.source)
+            yield from clause_tokens(item.condition)
+        elif not isinstance(item, Query):
+            yield item
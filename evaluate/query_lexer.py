@@ -0,0 +1,152 @@
+import re
+from collections import namedtuple
+
+# Виды лексем
+KEYWORD = "keyword"
+IDENTIFIER = "identifier"
+STRING = "string"
+PARAMETER = "parameter"
+NUMBER = "number"
+PUNCT = "punct"
+OPERATOR = "operator"
+
+Token = namedtuple("Token", ["kind", "text"])
+
+# Ключевые слова языка запросов 1С и SQL, не меняющиеся при нормализации
+QUERY_KEYWORDS = {
+    "ПЕРВЫЕ",
+    "РАЗЛИЧНЫЕ",
+    "ВНУТРЕННЕЕ",
+    "ЛЕВОЕ",
+    "ПРАВОЕ",
+    "ПОЛНОЕ",
+    "СОЕДИНЕНИЕ",
+    "ПО",
+    "BY",
+    "ОБЪЕДИНИТЬ",
+    "ВСЕ",
+    "В",
+    "МЕЖДУ",
+    "ПОДОБНО",
+    "ЕСТЬ",
+    "NULL",
+    "УБЫВ",
+    "ВОЗР",
+    "TOP",
+    "DISTINCT",
+    "INNER",
+    "LEFT",
+    "RIGHT",
+    "FULL",
+    "JOIN",
+    "ON",
+    "UNION",
+    "ALL",
+    "IN",
+    "BETWEEN",
+    "LIKE",
+    "IS",
+    "DESC",
+    "ASC",
+    "LIMIT",
+}
+
+# Составные ключевые слова: первое слово -> второе
+MULTIWORD_KEYWORDS = {
+    "СГРУППИРОВАТЬ": "ПО",
+    "УПОРЯДОЧИТЬ": "ПО",
+    "GROUP": "BY",
+    "ORDER": "BY",
+}
+
+# Символы слова: всё, кроме пробелов, разделителей и знаков операций,
+# чтобы мусор в ответе модели ("УБЫВ?") оставался одной лексемой
+_WORD = r"[^\s(),.\"&<>=!+\-*/]+"
+# Регулярное выражение одного прохода по запросу; вид лексемы
+# определяется по первому символу
+_TOKEN_PATTERN = re.compile(
+    "|".join(
+        [
+            # Имя, в том числе через точку (t1.Ссылка, t1.*), ключевое слово, число
+            rf"{_WORD}(?:\.(?:{_WORD}|\*)?)*",
+            r"[(),]",
+            # Строковый литерал 1С, кавычка внутри удваивается
+            r"\"(?:[^\"]|\"\")*\"?",
+            rf"&{_WORD}",
+            r"<>|<=|>=|!=",
+            r"\S",
+        ]
+    )
+)
+_NUMBER_PATTERN = re.compile(r"\d+(?:\.\d+)?")
+_FIRST_CHAR_KINDS = {
+    "(": PUNCT,
+    ")": PUNCT,
+    ",": PUNCT,
+    '"': STRING,
+    "&": PARAMETER,
+    **{c: OPERATOR for c in ".<>=!+-*/"},
+}
+
+
+class QueryLexer:
+    """
+    Лексический анализатор языка запросов 1С (и SQL) за один проход.
+
+    Текст лексем нормализован: верхний регистр, ключевые слова и логические
+    операторы заменены английскими эквивалентами, составные ключевые слова
+    ("УПОРЯДОЧИТЬ ПО") - одна лексема. Строковый литерал, параметр (&Имя)
+    и имя через точку (t1.Ссылка) - тоже одна лексема.
+
+    Лексемы неизменяемы, поэтому одинаковые слова разных запросов
+    разделяют один объект из кэша; это основная экономия времени.
+    """
+
+    def __init__(
+        self, keyword_map: dict, logical_map: dict, cache_size: int = 100000
+    ):
+        # Нормализация отдельных слов; составные - через один пробел
+        self.word_map = {}
+        for source, target in list(keyword_map.items()) + list(logical_map.items()):
+            self.word_map[" ".join(source.split())] = target
+        for target in set(keyword_map.values()) | set(logical_map.values()):
+            self.word_map.setdefault(target, target)
+        for keyword in QUERY_KEYWORDS:
+            self.word_map.setdefault(keyword, keyword)
+        self.cache_size = cache_size
+        self._tokens = {}
+
+    def tokenize(self, query: str) -> list:
+        tokens = []
+        cache = self._tokens
+        for text in _TOKEN_PATTERN.findall(query.upper()):
+            token = cache.get(text)
+            if token is None:
+                token = self._classify(text)
+                if len(cache) >= self.cache_size:
+                    cache.clear()
+                cache[text] = token
+            if token.kind == KEYWORD and tokens:
+                previous = tokens[-1]
+                if (
+                    previous.kind == IDENTIFIER
+                    and MULTIWORD_KEYWORDS.get(previous.text) == text
+                ):
+                    # Вторая часть составного ключевого слова
+                    keyword = self.word_map[f"{previous.text} {text}"]
+                    tokens[-1] = Token(KEYWORD, keyword)
+                    continue
+            tokens.append(token)
+        return tokens
+
+    def _classify(self, text: str) -> Token:
+        kind = _FIRST_CHAR_KINDS.get(text[0])
+        if kind is not None:
+            if kind == PARAMETER and len(text) == 1:
+                kind = OPERATOR
+            return Token(kind, text)
+        if text in self.word_map:
+            return Token(KEYWORD, self.word_map[text])
+        if _NUMBER_PATTERN.fullmatch(text):
+            return Token(NUMBER, text)
+        return Token(IDENTIFIER, text)
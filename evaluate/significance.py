@@ -0,0 +1,219 @@
+import argparse
+import csv
+import os
+from collections import namedtuple
+
+import numpy as np
+
+from batch_scorer import COLUMNS, score_file
+from bootstrap import MAX_CHUNK_ELEMENTS
+
+# Разности средних (модели x модели x метрики): difference[i, j] - модель i
+# минус модель j; p-значения и значимость (p < alpha после поправки)
+PairwiseTest = namedtuple("PairwiseTest", ["difference", "p_values", "significant"])
+
+
+def _as_tensor(scores) -> np.ndarray:
+    scores = np.asarray(scores, dtype=np.float64)
+    if scores.ndim == 2:
+        scores = scores[:, :, None]
+    return scores
+
+
+def _chunk_sizes(total: int, per_iteration: int, max_chunk_elements: int) -> list:
+    chunk = max(1, min(total, max_chunk_elements // max(per_iteration, 1)))
+    return [min(chunk, total - i) for i in range(0, total, chunk)]
+
+
+def _holm(p_values: np.ndarray) -> np.ndarray:
+    """
+    Поправка Холма - Бонферрони по всем парам моделей, отдельно для
+    каждой метрики (p_values: пары x метрики).
+    """
+    m = len(p_values)
+    order = np.argsort(p_values, axis=0)
+    ranked = np.take_along_axis(p_values, order, axis=0) * (m - np.arange(m))[:, None]
+    ranked = np.minimum(np.maximum.accumulate(ranked, axis=0), 1.0)
+    adjusted = np.empty_like(p_values)
+    np.put_along_axis(adjusted, order, ranked, axis=0)
+    return adjusted
+
+
+def _result(difference, p_pairs, alpha: float, correction: str) -> PairwiseTest:
+    models = difference.shape[0]
+    upper = np.triu_indices(models, k=1)
+    if correction == "holm":
+        p_pairs = _holm(p_pairs)
+    elif correction != "none":
+        raise ValueError(f"Неизвестная поправка: {correction}")
+    p_values = np.ones_like(difference)
+    p_values[upper] = p_pairs
+    p_values[upper[1], upper[0]] = p_pairs
+    return PairwiseTest(difference, p_values, p_values < alpha)
+
+
+def paired_bootstrap(
+    scores,
+    n_bootstrap: int = 1000,
+    alpha: float = 0.05,
+    correction: str = "holm",
+    seed: int = None,
+    max_chunk_elements: int = MAX_CHUNK_ELEMENTS,
+) -> PairwiseTest:
+    """
+    Парный бутстрэп разностей средних для всех пар моделей.
+
+    :param scores: оценки (модели x строки x метрики) или (модели x строки);
+        строка i у всех моделей - один и тот же вопрос тестовой выборки
+
+    Все модели переотбираются по одним и тем же строкам: матрица повторов
+    строк умножается на оценки всех моделей сразу, разности средних
+    вычисляются для всех пар одной операцией. Двустороннее p-значение:
+    2 * (число бутстрэп-разностей по другую сторону от нуля + 1) /
+    (n_bootstrap + 1).
+    """
+    scores = _as_tensor(scores)
+    models, n, metrics = scores.shape
+    flat = scores.transpose(1, 0, 2).reshape(n, models * metrics)
+    upper = np.triu_indices(models, k=1)
+    means = scores.mean(axis=1)
+    difference = means[:, None, :] - means[None, :, :]
+    not_above = np.zeros((len(upper[0]), metrics))
+    not_below = np.zeros((len(upper[0]), metrics))
+    sizes = _chunk_sizes(
+        n_bootstrap, max(n, models * models * metrics), max_chunk_elements
+    )
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    for seed_sequence, size in zip(seeds, sizes):
+        rng = np.random.default_rng(seed_sequence)
+        indices = rng.integers(0, n, size=(size, n))
+        indices += np.arange(size)[:, None] * n
+        counts = np.bincount(indices.ravel(), minlength=size * n).reshape(size, n)
+        boot = (counts @ flat / n).reshape(size, models, metrics)
+        pairs = boot[:, upper[0]] - boot[:, upper[1]]
+        not_above += (pairs <= 0).sum(axis=0)
+        not_below += (pairs >= 0).sum(axis=0)
+    # Как и в approximate_randomization, p-значение не бывает нулевым
+    tail = np.minimum(not_above, not_below)
+    p_pairs = np.minimum(2 * (tail + 1) / (n_bootstrap + 1), 1.0)
+    return _result(difference, p_pairs, alpha, correction)
+
+
+def approximate_randomization(
+    scores,
+    n_permutations: int = 10000,
+    alpha: float = 0.05,
+    correction: str = "holm",
+    seed: int = None,
+    max_chunk_elements: int = MAX_CHUNK_ELEMENTS,
+) -> PairwiseTest:
+    """
+    Тест приближённой рандомизации для всех пар моделей.
+
+    Перестановка меняет местами оценки двух моделей в случайных строках,
+    то есть умножает построчную разность на случайный знак. Матрица знаков
+    (перестановки x строки) умножается на оценки всех моделей, поэтому
+    разности для всех пар получаются за одно умножение, а память не зависит
+    от числа пар. p-значение: (число перестановок с |разностью| не меньше
+    наблюдаемой + 1) / (n_permutations + 1).
+    """
+    scores = _as_tensor(scores)
+    models, n, metrics = scores.shape
+    flat = scores.transpose(1, 0, 2).reshape(n, models * metrics)
+    upper = np.triu_indices(models, k=1)
+    means = scores.mean(axis=1)
+    difference = means[:, None, :] - means[None, :, :]
+    observed = np.abs(difference[upper])
+    # Допуск на ошибку округления при совпадающих разностях
+    observed -= 1e-12
+    extreme = np.zeros_like(observed)
+    sizes = _chunk_sizes(
+        n_permutations, max(n, models * models * metrics), max_chunk_elements
+    )
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    for seed_sequence, size in zip(seeds, sizes):
+        rng = np.random.default_rng(seed_sequence)
+        signs = rng.integers(0, 2, size=(size, n), dtype=np.int8) * 2 - 1
+        permuted = (signs @ flat / n).reshape(size, models, metrics)
+        # Знак строки одинаков для всех моделей: разность пар - разность сумм
+        pairs = permuted[:, upper[0]] - permuted[:, upper[1]]
+        extreme += (np.abs(pairs) >= observed).sum(axis=0)
+    p_pairs = (extreme + 1) / (n_permutations + 1)
+    return _result(difference, p_pairs, alpha, correction)
+
+
+def load_model_scores(directory: str, name: str) -> dict:
+    """
+    Оценки модели по строкам из results/pred_{name}.csv; колонка executed -
+    по номерам строк results/pred_{name}_exec.csv, если файл есть.
+    """
+    rows, _ = score_file(os.path.join(directory, f"pred_{name}.csv"), processes=1)
+    exec_path = os.path.join(directory, f"pred_{name}_exec.csv")
+    if os.path.exists(exec_path):
+        with open(exec_path, encoding="utf-8-sig", newline="") as file:
+            reader = csv.reader(file, delimiter=";")
+            executed = {int(row[0]) for row in reader if row and row[0].isdigit()}
+        rows["executed"] = np.array(
+            [i in executed for i in range(len(rows["exact"]))], dtype=np.float64
+        )
+    return rows
+
+
+def format_matrix(names: list, test: PairwiseTest, metric: int) -> str:
+    """
+    Матрица значимости одной метрики: "+" - модель строки значимо лучше
+    модели столбца, "-" - значимо хуже, "." - различие не значимо.
+    """
+    width = max(len(name) for name in names)
+    lines = [" " * width + " " + " ".join(str(j) for j in range(len(names)))]
+    for i, name in enumerate(names):
+        cells = []
+        for j in range(len(names)):
+            if i == j:
+                cells.append(" " * len(str(j)))
+                continue
+            if test.significant[i, j, metric]:
+                mark = "+" if test.difference[i, j, metric] > 0 else "-"
+            else:
+                mark = "."
+            cells.append(mark.rjust(len(str(j))))
+        lines.append(f"{name.ljust(width)} " + " ".join(cells) + f"  {i}")
+    return "\n".join(lines)
+
+
+def run():
+    parser = argparse.ArgumentParser(
+        description=(
+            "Попарное сравнение моделей на одной тестовой выборке: "
+            "парный бутстрэп или приближённая рандомизация"
+        )
+    )
+    parser.add_argument("models", nargs="+", help="имена файлов results/pred_{имя}.csv")
+    parser.add_argument("--results", default="results")
+    parser.add_argument(
+        "--method", choices=["randomization", "bootstrap"], default="randomization"
+    )
+    parser.add_argument("--iterations", type=int, default=10000)
+    parser.add_argument("--alpha", type=float, default=0.05)
+    parser.add_argument("--correction", choices=["holm", "none"], default="holm")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    scores = [load_model_scores(args.results, name) for name in args.models]
+    # executed - только если есть у всех моделей
+    columns = [c for c in COLUMNS + ["executed"] if all(c in s for s in scores)]
+    tensor = np.stack([np.column_stack([s[c] for c in columns]) for s in scores])
+    if args.method == "randomization":
+        test_function = approximate_randomization
+    else:
+        test_function = paired_bootstrap
+    test = test_function(
+        tensor, args.iterations, args.alpha, args.correction, args.seed
+    )
+    for k, column in enumerate(columns):
+        print(f"\n{column} (p < {args.alpha}, поправка {args.correction})")
+        print(format_matrix(args.models, test, k))
+
+
+if __name__ == "__main__":
+    run()
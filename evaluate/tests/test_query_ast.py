@@ -0,0 +1,66 @@
+from evaluate_model import component_matching_f1, parse_query
+from query_ast import Join, Query, clause_tokens, iter_blocks
+
+
+def texts(items) -> list:
+    return [token.text for token in clause_tokens(items)]
+
+
+def clauses(block) -> dict:
+    return {name: texts(items) for name, items in block.clauses}
+
+
+def test_union():
+    query = parse_query("ВЫБРАТЬ a ИЗ Т1 ОБЪЕДИНИТЬ ВСЕ ВЫБРАТЬ b ИЗ Т2 ГДЕ b > 1")
+    assert len(query.blocks) == 2
+    assert clauses(query.blocks[0]) == {"SELECT": ["A"], "FROM": ["Т1"]}
+    assert clauses(query.blocks[1]) == {
+        "SELECT": ["B"],
+        "FROM": ["Т2"],
+        "WHERE": ["B", ">", "1"],
+    }
+
+
+def test_nested_subqueries():
+    query = parse_query(
+        "ВЫБРАТЬ a ИЗ Т1 ГДЕ a В (ВЫБРАТЬ b ИЗ Т2 ГДЕ c В (ВЫБРАТЬ d ИЗ Т3))"
+    )
+    blocks = list(iter_blocks(query))
+    assert len(blocks) == 3
+    # Лексемы подзапроса не относятся к секции внешнего блока
+    outer_where = dict(blocks[0].clauses)["WHERE"]
+    assert texts(outer_where) == ["A", "В"]
+    assert isinstance(outer_where[-1], Query)
+    assert clauses(blocks[1])["WHERE"] == ["C", "В"]
+    assert clauses(blocks[2]) == {"SELECT": ["D"], "FROM": ["Т3"]}
+
+
+def test_subquery_source_in_parentheses():
+    query = parse_query("ВЫБРАТЬ t.a ИЗ (ВЫБРАТЬ a ИЗ Т1) КАК t")
+    blocks = list(iter_blocks(query))
+    assert len(blocks) == 2
+    assert clauses(blocks[0]) == {"SELECT": ["T.A"], "FROM": ["AS", "T"]}
+
+
+def test_join():
+    query = parse_query(
+        "ВЫБРАТЬ t1.a ИЗ Т1 КАК t1 ЛЕВОЕ СОЕДИНЕНИЕ Т2 КАК t2 ПО t1.x = t2.y "
+        "ГДЕ t2.z = 1"
+    )
+    (block,) = query.blocks
+    source = dict(block.clauses)["FROM"]
+    join = source[-1]
+    assert isinstance(join, Join)
+    assert texts(join.kind) == ["ЛЕВОЕ", "СОЕДИНЕНИЕ"]
+    assert texts(join.source) == ["Т2", "AS", "T2"]
+    assert texts(join.condition) == ["ПО", "T1.X", "=", "T2.Y"]
+    assert clauses(block)["WHERE"] == ["T2.Z", "=", "1"]
+
+
+def test_union_scored_per_block():
+    ref = "ВЫБРАТЬ a ИЗ Т1 ОБЪЕДИНИТЬ ВЫБРАТЬ b ИЗ Т2 ГДЕ b > 1"
+    assert component_matching_f1(ref, ref)["WHERE"] == 1.0
+    # Источники обоих блоков входят в секцию FROM эталона
+    scores = component_matching_f1("ВЫБРАТЬ a ИЗ Т1", ref)
+    assert scores["FROM"] == 0.6667
+    assert scores["WHERE"] == 0.0
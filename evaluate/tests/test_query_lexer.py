@@ -0,0 +1,147 @@
+import os
+import random
+import re
+
+import pytest
+
+from benchmark_lexer import (
+    legacy_component_matching_f1,
+    legacy_normalize_query,
+    legacy_parse_query_components,
+    load_references,
+)
+from evaluate_model import (
+    STRING_WORDS,
+    component_matching_f1,
+    normalize_query,
+    parse_query,
+    parse_query_components,
+    query_tokens,
+)
+from query_ast import iter_blocks
+from query_lexer import STRING
+
+TEST_PATH = os.path.join(
+    os.path.dirname(__file__), "..", "..", "dataset", "data", "ru_test.json"
+)
+REFERENCES = load_references(TEST_PATH)
+
+# Прежняя реализация заменяла ключевые слова и внутри имён
+# ("ОРГАНИЗАЦИЯ" -> "ОРГАНFROMАЦИЯ"); такие запросы сравниваются
+# только в FIXED_QUERIES
+MANGLED = re.compile(r"\w(?:SELECT|FROM|WHERE|AS)|(?:SELECT|FROM|WHERE|AS)\w")
+UNMANGLED = [q for q in REFERENCES if not MANGLED.search(legacy_normalize_query(q))]
+
+# Запросы с характерными для 1С конструкциями: составные ключевые слова,
+# параметры, строки с запятыми и кавычками, смешение языков и регистров
+CANONICAL_QUERIES = [
+    "ВЫБРАТЬ t1.Наименование ИЗ Справочник.Номенклатура КАК t1",
+    "выбрать первые 10 t1.Код, t1.Цена из Справочник.Товары как t1 "
+    "где t1.Цена > 100 и не t1.ПометкаУдаления упорядочить по t1.Цена убыв",
+    "ВЫБРАТЬ t1.Склад, СУММА(t1.Количество) КАК Количество "
+    "ИЗ РегистрНакопления.ТоварыНаСкладах КАК t1 "
+    "СГРУППИРОВАТЬ ПО t1.Склад ИМЕЮЩИЕ СУММА(t1.Количество) > 0",
+    "ВЫБРАТЬ t1.Ссылка ИЗ Документ.Заказ КАК t1 "
+    'ГДЕ t1.Комментарий ПОДОБНО "%срочно, до 10:00%" ИЛИ t1.Дата >= &НачалоПериода',
+    "ВЫБРАТЬ t1.* ИЗ Справочник.Контрагенты КАК t1 "
+    'ГДЕ t1.Наименование = "ООО ""Ромашка"" (Москва)"',
+    "SELECT t1.Name FROM Catalog.Items AS t1 WHERE t1.Price BETWEEN 1 AND 2 "
+    "GROUP BY t1.Name ORDER BY t1.Name",
+]
+
+# Намеренные отличия от прежней реализации: (запрос, компонента, ожидаемый текст)
+FIXED_QUERIES = [
+    # Ключевые слова заменяются только целыми словами, а не внутри имён
+    (
+        "ВЫБРАТЬ t1.Организация ИЗ Документ.Реализация КАК t1",
+        "SELECT",
+        "T1.ОРГАНИЗАЦИЯ",
+    ),
+    # Составное ключевое слово с несколькими пробелами или переносом строки
+    (
+        "ВЫБРАТЬ t1.Склад ИЗ Склады КАК t1 СГРУППИРОВАТЬ\n   ПО t1.Склад",
+        "GROUP BY",
+        "T1.СКЛАД",
+    ),
+    # Скобки и запятые внутри строкового литерала не отделяются пробелами
+    (
+        'ВЫБРАТЬ t1.Код ИЗ Контрагенты КАК t1 ГДЕ t1.Имя = "ООО (Москва), филиал"',
+        "WHERE",
+        'T1.ИМЯ = "ООО (МОСКВА), ФИЛИАЛ"',
+    ),
+    # Операторы отделяются от операндов: "t1.Сумма>1" и "t1.Сумма > 1"
+    # дают одну и ту же секцию (прежде - разные, F1 секции WHERE 0.0)
+    (
+        "ВЫБРАТЬ t1.Код ИЗ Товары КАК t1 ГДЕ t1.Сумма>1",
+        "WHERE",
+        "T1.СУММА > 1",
+    ),
+    # Унарный минус - отдельная лексема: "-1" нормализуется в "- 1"
+    (
+        "ВЫБРАТЬ t1.Код ИЗ Товары КАК t1 ГДЕ t1.Остаток >= -1",
+        "WHERE",
+        "T1.ОСТАТОК >= - 1",
+    ),
+]
+
+
+def token_words(query: str) -> list:
+    """
+    Лексемы запроса в виде слов прежней реализации: составные ключевые
+    слова и строковые литералы делятся на слова, скобки и запятые.
+    """
+    words = []
+    for token in query_tokens(query):
+        if token.kind == STRING:
+            words.extend(STRING_WORDS.findall(token.text))
+        else:
+            words.extend(token.text.split())
+    return words
+
+
+def has_string_punctuation(query: str) -> bool:
+    return any(
+        token.kind == STRING and re.search(r"[(),]", token.text)
+        for token in query_tokens(query)
+    )
+
+
+def test_references_are_compared():
+    assert len(REFERENCES) > 900
+    assert len(UNMANGLED) > 0.9 * len(REFERENCES)
+
+
+def test_normalize_query_matches_legacy():
+    for query in UNMANGLED:
+        if not has_string_punctuation(query):
+            assert normalize_query(query) == legacy_normalize_query(query), query
+
+
+def test_query_tokens_match_legacy():
+    for query in UNMANGLED:
+        assert token_words(query) == legacy_normalize_query(query).split(), query
+
+
+@pytest.mark.parametrize("query", CANONICAL_QUERIES)
+def test_canonical_tokens_match_legacy(query):
+    assert token_words(query) == legacy_normalize_query(query).split()
+
+
+def test_component_f1_matches_legacy():
+    # Запросы из одного блока: объединения и подзапросы прежняя
+    # реализация оценивала неверно
+    simple = [q for q in UNMANGLED if len(list(iter_blocks(parse_query(q)))) == 1]
+    rng = random.Random(0)
+    pairs = [(q, q) for q in simple]
+    pairs += [(rng.choice(simple), rng.choice(simple)) for _ in range(2000)]
+    pairs += [(p, r) for p in CANONICAL_QUERIES for r in CANONICAL_QUERIES]
+    for pred, ref in pairs:
+        assert component_matching_f1(pred, ref) == legacy_component_matching_f1(
+            pred, ref
+        ), (pred, ref)
+
+
+@pytest.mark.parametrize("query, component, expected", FIXED_QUERIES)
+def test_fixed_queries(query, component, expected):
+    assert parse_query_components(query)[component] == expected
+    assert legacy_parse_query_components(query)[component] != expected